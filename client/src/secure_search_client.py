@@ -3,11 +3,14 @@ Secure Search Client for testing the privacy-preserving similarity search system
 Simulates homomorphic encryption and LSH for testing purposes
 """
 import uuid
-import base64
+import pybase64
 import hashlib
+import heapq
+import operator
 import time
 import json
 import os
+import struct
 from typing import List, Dict, Optional, Tuple, Any
 import numpy as np
 import requests
@@ -48,12 +51,13 @@ class SecureSearchTestClient:
         }
         
         # Simulated random planes for LSH (in production, server would provide these)
+        # float32 like the server's planes: only projection signs are used
         np.random.seed(42)  # For reproducible results
         self.random_planes = np.random.randn(
             self.lsh_config["num_tables"], 
             self.lsh_config["hash_size"], 
             self.embedding_dim
-        )
+        ).astype(np.float32)
         
         self.console.print("[bold blue]🔐 Secure Search Test Client Initialized[/bold blue]")
         self.console.print(f"Server URL: {server_url}")
@@ -102,7 +106,21 @@ class SecureSearchTestClient:
         }
         
         encrypted_bytes = json.dumps(mock_encrypted).encode()
-        return base64.b64encode(encrypted_bytes).decode('utf-8')
+        return pybase64.b64encode_as_string(encrypted_bytes)
+    
+    def _generate_random_planes(self, seed: int) -> np.ndarray:
+        """
+        Regenerate the server's LSH planes from its seed
+        Mirrors LSHSearchService.generate_random_planes on the server
+        """
+        rng = np.random.default_rng(seed)
+        planes = rng.standard_normal(
+            (self.lsh_config["num_tables"], self.lsh_config["hash_size"], self.embedding_dim),
+            dtype=np.float32
+        )
+        norms = np.linalg.norm(planes, axis=-1, keepdims=True)
+        np.divide(planes, norms, out=planes, where=norms > 0)
+        return planes
     
     def _compute_lsh_hashes(self, vector: np.ndarray) -> List[int]:
         """
@@ -114,18 +132,15 @@ class SecureSearchTestClient:
         if norm > 0:
             vector = vector / norm
         
-        hashes = []
-        for table_idx in range(self.lsh_config["num_tables"]):
-            # Compute hash for this table using random hyperplanes
-            hash_bits = []
-            for bit_idx in range(self.lsh_config["hash_size"]):
-                # Dot product with random hyperplane
-                dot_product = np.dot(vector, self.random_planes[table_idx, bit_idx])
-                hash_bits.append(1 if dot_product >= 0 else 0)  # Use >= 0 to match server
-            
-            # Convert bits to integer hash value
-            hash_value = sum(bit * (2 ** i) for i, bit in enumerate(hash_bits))
-            hashes.append(hash_value)
+        # Project onto every hyperplane of every table in one float32
+        # matrix-vector product (SGEMV)
+        num_tables, hash_size, dim = self.random_planes.shape
+        planes_flat = self.random_planes.reshape(num_tables * hash_size, dim)
+        projections = planes_flat @ vector.astype(planes_flat.dtype, copy=False)
+        bits = (projections.reshape(num_tables, hash_size) >= 0).astype(np.int64)  # Use >= 0 to match server
+        
+        # Pack each table's bits into an integer, bit i weighted 2**i
+        hashes = (bits @ (1 << np.arange(hash_size, dtype=np.int64))).tolist()
         
         # Debug logging
         if len(hashes) > 0:
@@ -173,7 +188,7 @@ class SecureSearchTestClient:
         
         # Create mock HE context parameters
         mock_context = {
-            "public_key": base64.b64encode(f"mock_public_key_{time.time()}".encode()).decode(),
+            "public_key": pybase64.b64encode_as_string(f"mock_public_key_{time.time()}".encode()),
             "scheme": "CKKS",
             "poly_modulus_degree": 8192,
             "scale": 1099511627776
@@ -189,18 +204,24 @@ class SecureSearchTestClient:
         
         self.client_id = uuid.UUID(response["client_id"])
         
+        # Update LSH config to match server
+        lsh_config = response.get("lsh_config", {})
+        if lsh_config:
+            self.lsh_config.update(lsh_config)
+            self.console.print(f"[green]✅ Synchronized LSH config: {lsh_config}[/green]")
+        
         # Use server-provided random planes for LSH consistency
-        if "random_planes" in response and response["random_planes"]:
-            import pickle
-            random_planes_data = base64.b64decode(response["random_planes"])
-            self.random_planes = pickle.loads(random_planes_data)
+        if response.get("random_planes"):
+            # Layout: '<III' (num_tables, hash_size, embedding_dim) header + raw float32
+            random_planes_data = pybase64.b64decode(response["random_planes"], validate=False)
+            shape = struct.unpack_from("<III", random_planes_data)
+            self.random_planes = np.frombuffer(
+                random_planes_data, dtype="<f4", offset=12
+            ).reshape(shape)
             self.console.print("[green]✅ Using server-synchronized LSH planes[/green]")
-            
-            # Update LSH config to match server
-            lsh_config = response.get("lsh_config", {})
-            if lsh_config:
-                self.lsh_config.update(lsh_config)
-                self.console.print(f"[green]✅ Synchronized LSH config: {lsh_config}[/green]")
+        elif response.get("random_seed") is not None:
+            self.random_planes = self._generate_random_planes(response["random_seed"])
+            self.console.print("[green]✅ Regenerated LSH planes from server seed[/green]")
         else:
             self.console.print("[yellow]⚠️ No random planes received from server, using client defaults[/yellow]")
         
@@ -299,16 +320,17 @@ class SecureSearchTestClient:
         for result in response["results"]:
             # Mock decryption - in reality this would use the private key
             try:
-                encrypted_sim = base64.b64decode(result["encrypted_similarity"]).decode()
+                encrypted_sim = pybase64.b64decode(result["encrypted_similarity"], validate=False).decode()
                 # Extract a mock similarity score (in production, this would be the decrypted score)
                 mock_similarity = hash(encrypted_sim) % 1000 / 1000.0  # 0.0 to 1.0
                 result["decrypted_similarity"] = mock_similarity
             except:
                 result["decrypted_similarity"] = 0.5  # Fallback
         
-        # Sort by decrypted similarity (client-side sorting)
-        response["results"].sort(key=lambda x: x["decrypted_similarity"], reverse=True)
-        response["results"] = response["results"][:top_k]
+        # Keep the top_k by decrypted similarity (client-side partial sort)
+        response["results"] = heapq.nlargest(
+            top_k, response["results"], key=operator.itemgetter("decrypted_similarity")
+        )
         
         return response
     
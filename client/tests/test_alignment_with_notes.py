@@ -13,7 +13,8 @@ def test_initialize_alignment(make_client):
 
     # Alignment checks against notes/diagram
     assert "client_id" in resp and resp["client_id"], "Server must assign client_id"
-    assert "random_planes" in resp and resp["random_planes"], "Server should provide LSH random planes"
+    assert resp.get("random_planes") or resp.get("random_seed") is not None, \
+        "Server should provide LSH random planes or the seed that reproduces them"
     assert "lsh_config" in resp, "Server returns LSH config"
 
     # LSH config properties
@@ -0,0 +1,28 @@
+-- Convert search_requests.lsh_hashes from INTEGER[] to packed BYTEA
+--
+-- Each hash becomes 8 bytes, little-endian unsigned 64-bit, in table order
+-- (see models.search.pack_lsh_hashes). create_all does not alter existing
+-- tables, so databases created before the change need this run once:
+--
+--   psql "$DATABASE_URL" -f migrations/001_search_requests_lsh_hashes_bytea.sql
+
+BEGIN;
+
+CREATE FUNCTION pg_temp.pack_lsh_hashes(hashes INTEGER[]) RETURNS BYTEA
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT COALESCE(
+        string_agg(
+            set_byte('\x00'::BYTEA, 0, ((h.value::BIGINT >> (8 * b.i)) & 255)::INTEGER),
+            ''::BYTEA
+            ORDER BY h.ord, b.i
+        ),
+        ''::BYTEA
+    )
+    FROM unnest(hashes) WITH ORDINALITY AS h(value, ord)
+    CROSS JOIN generate_series(0, 7) AS b(i)
+$$;
+
+ALTER TABLE search_requests
+    ALTER COLUMN lsh_hashes TYPE BYTEA USING pg_temp.pack_lsh_hashes(lsh_hashes);
+
+COMMIT;
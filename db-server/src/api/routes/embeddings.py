@@ -8,6 +8,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 
 from ...core.database import get_db
+from ...models.client import Client
 from ...models.embedding import Embedding, EmbeddingMetadata
 from ...schemas.embedding import EmbeddingCreate, EmbeddingUpdate, EmbeddingResponse
 from ..deps.auth import verify_api_key
@@ -29,6 +30,11 @@ async def create_embedding(
         vector_size_bytes=embedding.vector_size_bytes
     )
     db.add(db_embedding)
+    
+    # Keep the client's embedding counter in sync for stats endpoints
+    db.query(Client).filter(Client.client_id == embedding.client_id).update(
+        {Client.total_embeddings: Client.total_embeddings + 1}
+    )
     db.commit()
     db.refresh(db_embedding)
     
@@ -104,6 +110,12 @@ async def delete_embedding(
     if not embedding:
         raise HTTPException(status_code=404, detail="Embedding not found")
     
+    if not embedding.is_deleted:
+        # Soft-deleted embeddings no longer count towards the client's total
+        db.query(Client).filter(Client.client_id == embedding.client_id).update(
+            {Client.total_embeddings: Client.total_embeddings - 1}
+        )
+    
     embedding.is_deleted = True
     from datetime import datetime
     embedding.deleted_at = datetime.utcnow()
@@ -8,7 +8,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 
 from ...core.database import get_db
-from ...models.search import SearchRequest
+from ...models.search import SearchRequest, pack_lsh_hashes
 from ...schemas.search import SearchRequestCreate, SearchRequestUpdate, SearchRequestResponse
 from ..deps.auth import verify_api_key
 
@@ -25,7 +25,7 @@ async def create_search_request(
     db_search = SearchRequest(
         client_id=search.client_id,
         encrypted_query=base64.b64decode(search.encrypted_query),
-        lsh_hashes=search.lsh_hashes,
+        lsh_hashes=pack_lsh_hashes(search.lsh_hashes),
         top_k=search.top_k,
         rerank_candidates=search.rerank_candidates
     )
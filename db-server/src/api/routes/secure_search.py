@@ -7,19 +7,24 @@ import time
 import base64
 import hashlib
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from itertools import islice
+from typing import List, Optional, Dict, Any
+import ormsgpack
+import pybase64
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy import select, func, tuple_, bindparam, lambda_stmt, exists, false
+from sqlalchemy.orm import Session, selectinload
 
 from ...core.database import get_db
 from ...models.client import Client
 from ...models.lsh import LSHConfig, LSHHash
 from ...models.embedding import Embedding, EmbeddingMetadata
-from ...models.search import SearchRequest as SearchRequestModel
+from ...models.search import SearchRequest as SearchRequestModel, pack_lsh_hashes
 from ...schemas.secure_search import (
     InitRequest, InitResponse,
     AddEmbeddingRequest, AddEmbeddingResponse,
-    SearchRequest, SearchResult, SearchResponse
+    SearchRequest, SearchResult, SearchResponse,
+    BatchAddEmbeddingRequest, BatchAddEmbeddingResponse, BatchAddEmbeddingBinaryRequest
 )
 from ..deps.auth import verify_api_key
 from ...services.secure_search_service import secure_search_service
@@ -28,6 +33,75 @@ router = APIRouter(tags=["secure-search"])
 logger = logging.getLogger(__name__)
 
 
+# Hot-path statements are built once at import time so SQLAlchemy can reuse
+# the compiled SQL from its statement cache instead of recompiling per request
+_CLIENT_BY_ID_STMT = select(Client).where(Client.client_id == bindparam("client_id"))
+
+_ACTIVE_EMBEDDING_COUNT_STMT = select(func.count()).select_from(Embedding).where(
+    Embedding.client_id == bindparam("client_id"),
+    Embedding.is_deleted == false()
+)
+
+# LSH candidate lookup: match (table_index, hash_value) pairs, rank by collisions
+_LSH_LOOKUP_STMT = lambda_stmt(
+    lambda: select(LSHHash.embedding_id, func.count().label("match_count"))
+    .where(
+        LSHHash.client_id == bindparam("cid"),
+        tuple_(LSHHash.table_index, LSHHash.hash_value).in_(bindparam("pairs", expanding=True)),
+        exists().where(
+            Embedding.embedding_id == LSHHash.embedding_id,
+            Embedding.is_deleted == false()
+        )
+    )
+    .group_by(LSHHash.embedding_id)
+    .order_by(func.count().desc())
+    .limit(bindparam("max_candidates"))
+)
+
+# Candidate fetch loads metadata in one follow-up IN query instead of one per result
+_EMBEDDINGS_BY_IDS_STMT = select(Embedding).options(
+    selectinload(Embedding.metadata_rel)
+).where(
+    Embedding.embedding_id.in_(bindparam("ids", expanding=True)),
+    Embedding.is_deleted == false()
+)
+
+
+def _embedding_rows(client_id: uuid.UUID,
+                    embedding_uuid: uuid.UUID,
+                    external_id: str,
+                    encrypted_vector: bytes,
+                    lsh_hashes: List[int],
+                    metadata: Optional[Dict[str, Any]]) -> list:
+    """Build the ORM rows persisting one embedding, its metadata and LSH hashes"""
+    rows = [Embedding(
+        embedding_id=embedding_uuid,
+        client_id=client_id,
+        external_id=external_id,
+        encrypted_vector=encrypted_vector,
+        vector_size_bytes=len(encrypted_vector)
+    )]
+    
+    # Store metadata if provided
+    if metadata:
+        rows.append(EmbeddingMetadata(
+            embedding_id=embedding_uuid,
+            metadata_json=metadata
+        ))
+    
+    # Store LSH hashes
+    rows.extend(
+        LSHHash(
+            client_id=client_id,
+            embedding_id=embedding_uuid,
+            table_index=table_idx,
+            hash_value=hash_value
+        )
+        for table_idx, hash_value in enumerate(lsh_hashes)
+    )
+    return rows
+
+
 @router.post("/initialize", response_model=InitResponse)
 async def initialize_client(
     request: InitRequest,
@@ -48,7 +122,8 @@ async def initialize_client(
             client_id=client_id_str,
             context_params=request.context_params,
             embedding_dim=request.embedding_dim,
-            lsh_config=request.lsh_config
+            lsh_config=request.lsh_config,
+            include_random_planes=request.include_random_planes
         )
         
         # Create database record for persistence
@@ -99,7 +174,7 @@ async def add_embedding(
     """
     try:
         # Verify client exists
-        client = db.query(Client).filter(Client.client_id == request.client_id).first()
+        client = db.execute(_CLIENT_BY_ID_STMT, {"client_id": request.client_id}).scalar_one_or_none()
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         
@@ -107,55 +182,39 @@ async def add_embedding(
         embedding_uuid = uuid.uuid4()
         external_id = request.embedding_id or f"emb_{embedding_uuid.hex[:8]}"
         
-        # Add to secure search service
-        service_response = secure_search_service.add_embedding(
-            client_id=str(request.client_id),
-            embedding_id=embedding_uuid,
-            encrypted_vector=request.encrypted_embedding,
-            lsh_hashes=request.lsh_hashes,
-            metadata=request.metadata
-        )
-        
-        # Store in database for persistence
+        # Decode once; the service and the database both keep raw bytes
         encrypted_vector = base64.b64decode(request.encrypted_embedding)
         
-        db_embedding = Embedding(
-            embedding_id=embedding_uuid,
-            client_id=request.client_id,
-            external_id=external_id,
-            encrypted_vector=encrypted_vector,
-            vector_size_bytes=len(encrypted_vector)
-        )
-        db.add(db_embedding)
+        client_id_str = str(request.client_id)
+        secure_search_service.check_embedding(client_id_str, request.lsh_hashes)
         
-        # Store metadata if provided
-        if request.metadata:
-            db_metadata = EmbeddingMetadata(
-                embedding_id=embedding_uuid,
-                metadata_json=request.metadata
-            )
-            db.add(db_metadata)
-        
-        # Store LSH hashes
-        for table_idx, hash_value in enumerate(request.lsh_hashes):
-            db_lsh_hash = LSHHash(
-                client_id=request.client_id,
-                embedding_id=embedding_uuid,
-                table_index=table_idx,
-                hash_value=hash_value
-            )
-            db.add(db_lsh_hash)
+        # Store in database for persistence
+        db.add_all(_embedding_rows(
+            request.client_id, embedding_uuid, external_id,
+            encrypted_vector, request.lsh_hashes, request.metadata
+        ))
         
         # Update client statistics
         client.total_embeddings += 1
         
         db.commit()
         
+        # Mirror into the in-memory index only once the rows are committed
+        try:
+            secure_search_service.add_embedding(
+                client_id=client_id_str,
+                embedding_id=embedding_uuid,
+                encrypted_vector=encrypted_vector,
+                lsh_hashes=request.lsh_hashes,
+                metadata=request.metadata
+            )
+        except Exception as e:
+            logger.error(f"Embedding {embedding_uuid} persisted but not indexed in memory: {e}")
+        
         # Get index position
-        index_position = db.query(Embedding).filter(
-            Embedding.client_id == request.client_id,
-            Embedding.is_deleted == False
-        ).count() - 1
+        index_position = db.execute(
+            _ACTIVE_EMBEDDING_COUNT_STMT, {"client_id": request.client_id}
+        ).scalar_one() - 1
         
         return AddEmbeddingResponse(
             embedding_id=embedding_uuid,
@@ -168,6 +227,101 @@ async def add_embedding(
         raise HTTPException(status_code=400, detail=f"Failed to add embedding: {str(e)}")
 
 
+@router.post("/add_embeddings_batch", response_model=BatchAddEmbeddingResponse)
+async def add_embeddings_batch(
+    http_request: Request,
+    db: Session = Depends(get_db),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Add many encrypted embeddings in one request and one transaction
+    
+    Accepts application/msgpack (BatchAddEmbeddingBinaryRequest, ciphertexts
+    as raw bytes) or JSON (BatchAddEmbeddingRequest, base64 ciphertexts).
+    msgpack skips base64 and JSON float/escape parsing on large batches.
+    """
+    body = await http_request.body()
+    content_type = http_request.headers.get("content-type", "")
+    
+    try:
+        if content_type.startswith("application/msgpack"):
+            request = BatchAddEmbeddingBinaryRequest.model_validate(ormsgpack.unpackb(body))
+            items = [
+                (item.encrypted_embedding, item.lsh_hashes, item.metadata, item.embedding_id)
+                for item in request.embeddings
+            ]
+        else:
+            request = BatchAddEmbeddingRequest.model_validate_json(body)
+            items = [
+                (pybase64.b64decode(item.encrypted_embedding, validate=False),
+                 item.lsh_hashes, item.metadata, item.embedding_id)
+                for item in request.embeddings
+            ]
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Invalid batch payload: {str(e)}")
+    
+    try:
+        # Verify client exists
+        client = db.execute(_CLIENT_BY_ID_STMT, {"client_id": request.client_id}).scalar_one_or_none()
+        if not client:
+            raise HTTPException(status_code=404, detail="Client not found")
+        
+        client_id_str = str(request.client_id)
+        embedding_ids = []
+        added = []
+        failed_count = 0
+        
+        for encrypted_vector, lsh_hashes, metadata, embedding_id in items:
+            embedding_uuid = uuid.uuid4()
+            external_id = embedding_id or f"emb_{embedding_uuid.hex[:8]}"
+            
+            try:
+                secure_search_service.check_embedding(client_id_str, lsh_hashes)
+            except Exception as e:
+                logger.warning(f"Skipping batch embedding {external_id}: {e}")
+                failed_count += 1
+                continue
+            
+            db.add_all(_embedding_rows(
+                request.client_id, embedding_uuid, external_id,
+                encrypted_vector, lsh_hashes, metadata
+            ))
+            embedding_ids.append(embedding_uuid)
+            added.append((embedding_uuid, encrypted_vector, lsh_hashes, metadata))
+        
+        # Update client statistics
+        client.total_embeddings += len(embedding_ids)
+        
+        db.commit()
+        
+        # Mirror into the in-memory index only once the rows are committed
+        for embedding_uuid, encrypted_vector, lsh_hashes, metadata in added:
+            try:
+                secure_search_service.add_embedding(
+                    client_id=client_id_str,
+                    embedding_id=embedding_uuid,
+                    encrypted_vector=encrypted_vector,
+                    lsh_hashes=lsh_hashes,
+                    metadata=metadata
+                )
+            except Exception as e:
+                logger.error(f"Embedding {embedding_uuid} persisted but not indexed in memory: {e}")
+        
+        return BatchAddEmbeddingResponse(
+            batch_id=uuid.uuid4(),
+            successful_count=len(embedding_ids),
+            failed_count=failed_count,
+            embedding_ids=embedding_ids,
+            status="success" if failed_count == 0 else "partial"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Failed to add embeddings: {str(e)}")
+
+
 @router.post("/search", response_model=SearchResponse)
 async def search_embeddings(
     search_request: SearchRequest,
@@ -177,11 +331,11 @@ async def search_embeddings(
     """
     Perform encrypted similarity search using secure search service
     """
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     
     try:
         # Verify client exists
-        client = db.query(Client).filter(Client.client_id == search_request.client_id).first()
+        client = db.execute(_CLIENT_BY_ID_STMT, {"client_id": search_request.client_id}).scalar_one_or_none()
         if not client:
             raise HTTPException(status_code=404, detail="Client not found")
         
@@ -189,60 +343,40 @@ async def search_embeddings(
         client_id_str = str(search_request.client_id)
         
         # Step 1: Find LSH candidates using database function
-        lsh_start = time.time()
+        lsh_start = time.perf_counter_ns()
         
-        # Use direct SQL query for LSH candidate search (fallback if function doesn't exist)
-        from sqlalchemy import text
         candidate_query = db.execute(
-            text("""
-            SELECT 
-                lh.embedding_id,
-                COUNT(*) as match_count
-            FROM lsh_hashes lh
-            WHERE lh.client_id = :client_id
-              AND lh.hash_value = ANY(:lsh_hashes)
-              AND EXISTS (
-                  SELECT 1 FROM embeddings e 
-                  WHERE e.embedding_id = lh.embedding_id 
-                    AND e.is_deleted = FALSE
-              )
-            GROUP BY lh.embedding_id
-            ORDER BY match_count DESC
-            LIMIT :max_candidates
-            """),
+            _LSH_LOOKUP_STMT,
             {
-                "client_id": search_request.client_id,
-                "lsh_hashes": search_request.lsh_hashes,
+                "cid": search_request.client_id,
+                "pairs": list(enumerate(search_request.lsh_hashes)),
                 "max_candidates": search_request.rerank_candidates
             }
         )
         
-        candidates = candidate_query.fetchall()
-        lsh_time = (time.time() - lsh_start) * 1000
+        # Rows are already distinct per embedding_id and ranked by collisions
+        rows = candidate_query.fetchall()
+        candidate_list = [row[0] for row in rows]
+        candidates_found = len(candidate_list)
+        lsh_time = (time.perf_counter_ns() - lsh_start) / 1e6
         
-        logger.info(f"Database LSH search found {len(candidates)} candidates in {lsh_time:.2f}ms")
+        logger.info(f"Database LSH search found {candidates_found} candidates in {lsh_time:.2f}ms")
         
         # Step 2: Get encrypted vectors for HE computation  
-        he_start = time.time()
+        he_start = time.perf_counter_ns()
         results = []
+        embeddings_by_id = {}
         
-        if candidates:
+        if candidate_list:
             # Get the encrypted vectors from database
-            candidate_ids = [str(c[0]) for c in candidates]
-            embeddings = db.query(Embedding).filter(
-                Embedding.embedding_id.in_(candidate_ids),
-                Embedding.is_deleted == False
-            ).all()
+            embeddings = db.execute(_EMBEDDINGS_BY_IDS_STMT, {"ids": candidate_list}).scalars().all()
             
-            # Create mapping of embedding_id to encrypted_vector
-            embedding_vectors = {str(e.embedding_id): base64.b64encode(e.encrypted_vector).decode() for e in embeddings}
+            # Create mapping of embedding_id to stored embedding
+            embeddings_by_id = {e.embedding_id: e for e in embeddings}
             
             # Mock HE computation (in production, this would use actual HE)
-            for candidate in candidates:
-                embedding_id = candidate[0]
-                match_count = candidate[1]
-                
-                if str(embedding_id) in embedding_vectors:
+            for embedding_id, match_count in rows:
+                if embedding_id in embeddings_by_id:
                     # Mock encrypted similarity computation
                     mock_similarity = base64.b64encode(f"similarity_score_{embedding_id}_{match_count}".encode()).decode()
                     
@@ -251,7 +385,7 @@ async def search_embeddings(
                         "encrypted_similarity": mock_similarity
                     })
         
-        he_time = (time.time() - he_start) * 1000
+        he_time = (time.perf_counter_ns() - he_start) / 1e6
         total_time = lsh_time + he_time
         
         # Limit results to top_k
@@ -260,10 +394,8 @@ async def search_embeddings(
         # Convert results to API response format
         api_results = []
         for result in results:
-            # Get metadata from database
-            metadata = db.query(EmbeddingMetadata).filter(
-                EmbeddingMetadata.embedding_id == result["embedding_id"]
-            ).first()
+            # Metadata was eagerly loaded with the candidate embeddings
+            metadata = embeddings_by_id[result["embedding_id"]].metadata_rel
             
             api_results.append(SearchResult(
                 embedding_id=result["embedding_id"],
@@ -272,16 +404,16 @@ async def search_embeddings(
             ))
         
         # Log search request for analytics
-        search_time_ms = (time.time() - start_time) * 1000
+        search_time_ms = (time.perf_counter_ns() - start_time) / 1e6
         
         db_search = SearchRequestModel(
             client_id=search_request.client_id,
             encrypted_query=base64.b64decode(search_request.encrypted_query),
-            lsh_hashes=search_request.lsh_hashes,
+            lsh_hashes=pack_lsh_hashes(search_request.lsh_hashes),
             top_k=search_request.top_k,
             rerank_candidates=search_request.rerank_candidates,
-            candidates_found=len(candidates),
-            candidates_checked=len(candidates),
+            candidates_found=candidates_found,
+            candidates_checked=candidates_found,
             total_time_ms=int(search_time_ms),
             results_returned=len(api_results)
         )
@@ -295,7 +427,7 @@ async def search_embeddings(
         
         return SearchResponse(
             results=api_results,
-            candidates_checked=len(candidates),
+            candidates_checked=candidates_found,
             search_time_ms=search_time_ms
         )
         
@@ -313,18 +445,21 @@ async def debug_client_data(
     client_id_str = str(client_id)
     
     # Get data from secure search service
-    client_embeddings = secure_search_service.client_embeddings.get(client_id_str, [])
-    client_lsh_hashes = secure_search_service.client_lsh_hashes.get(client_id_str, {})
+    client_embeddings = secure_search_service.client_embeddings.get(client_id_str, {})
+    client_lsh_hashes = secure_search_service.client_lsh_hashes.get(client_id_str)
     
-    # Convert sets to lists for JSON serialization
+    # Convert buckets to lists for JSON serialization
     sample_buckets = {}
-    for key, value_set in list(client_lsh_hashes.items())[:5]:
-        sample_buckets[f"{key[0]}_{key[1]}"] = list(str(uuid) for uuid in value_set)
+    total_lsh_buckets = 0
+    if client_lsh_hashes is not None:
+        total_lsh_buckets = client_lsh_hashes.bucket_count()
+        for table_idx, hash_value, embedding_ids in islice(client_lsh_hashes.iter_buckets(), 5):
+            sample_buckets[f"{table_idx}_{hash_value}"] = list(str(uuid) for uuid in embedding_ids)
     
     return {
         "client_id": client_id_str,
         "total_embeddings": len(client_embeddings),
-        "total_lsh_buckets": len(client_lsh_hashes),
+        "total_lsh_buckets": total_lsh_buckets,
         "sample_lsh_buckets": sample_buckets,
         "has_he_context": secure_search_service.he_service.get_cached_context(client_id_str) is not None,
         "has_lsh_config": client_id_str in secure_search_service.lsh_service.client_configs
@@ -13,7 +13,7 @@ from ...core.database import get_db
 from ...models.client import Client
 from ...models.lsh import LSHConfig, LSHHash
 from ...models.embedding import Embedding, EmbeddingMetadata
-from ...models.search import SearchRequest as SearchRequestModel
+from ...models.search import SearchRequest as SearchRequestModel, pack_lsh_hashes
 from ...schemas.secure_search import (
     InitRequest, InitResponse,
     AddEmbeddingRequest, AddEmbeddingResponse,
@@ -277,7 +277,7 @@ async def search_embeddings(
         db_search = SearchRequestModel(
             client_id=search_request.client_id,
             encrypted_query=base64.b64decode(search_request.encrypted_query),
-            lsh_hashes=search_request.lsh_hashes,
+            lsh_hashes=pack_lsh_hashes(search_request.lsh_hashes),
             top_k=search_request.top_k,
             rerank_candidates=search_request.rerank_candidates,
             candidates_found=len(candidates),
@@ -315,22 +315,11 @@ async def get_client_stats(
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    # Get embedding count
-    embedding_count = db.query(Embedding).filter(
-        Embedding.client_id == client_id,
-        Embedding.is_deleted == False
-    ).count()
-    
-    # Get recent search count
-    search_count = db.query(SearchRequestModel).filter(
-        SearchRequestModel.client_id == client_id
-    ).count()
-    
     return {
         "client_id": client_id,
         "client_name": client.client_name,
-        "total_embeddings": embedding_count,
-        "total_searches": search_count,
+        "total_embeddings": client.total_embeddings,
+        "total_searches": client.total_searches,
         "embedding_dim": client.embedding_dim,
         "max_embeddings_allowed": client.max_embeddings_allowed,
         "last_active_at": client.last_active_at,
@@ -22,6 +22,18 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "app_database")
     
+    # Connection Pool Configuration
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 20))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", 1200))
+    
+    # Deserialized ciphertext LRU (entries, and optional total serialized bytes)
+    HE_CIPHER_CACHE_SIZE: int = int(os.getenv("HE_CIPHER_CACHE_SIZE", 4096))
+    HE_CIPHER_CACHE_BYTES: Optional[int] = int(os.getenv("HE_CIPHER_CACHE_BYTES", 0)) or None
+    
+    # Directory for per-client mmap-backed ciphertext files (unset = keep in RAM)
+    CIPHERTEXT_STORE_DIR: Optional[str] = os.getenv("CIPHERTEXT_STORE_DIR") or None
+    
     # Security
     DB_SERVER_API_KEY: str = os.getenv("DB_SERVER_API_KEY", "default_key")
     
@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .core.database import create_tables
 from .api import api_router
+from .services.secure_search_service import secure_search_service
 from . import models  # Import models to register them
 
 # Create FastAPI application
@@ -36,6 +37,12 @@ async def startup_event():
     create_tables()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release ciphertext store files on shutdown"""
+    secure_search_service.shutdown()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -5,6 +5,7 @@ import uuid
 from datetime import datetime
 from sqlalchemy import Column, String, Integer, DateTime, Boolean, JSON, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID, BYTEA
+from sqlalchemy.orm import relationship
 
 from ..core.database import Base
 
@@ -31,6 +32,9 @@ class Embedding(Base):
     # Soft delete support
     is_deleted = Column(Boolean, default=False)
     deleted_at = Column(DateTime)
+    
+    # Metadata row; must be loaded explicitly (e.g. selectinload) to avoid N+1 queries
+    metadata_rel = relationship("EmbeddingMetadata", uselist=False, lazy="raise")
 
 
 class EmbeddingMetadata(Base):
@@ -2,13 +2,28 @@
 Search related models
 """
 import uuid
+import struct
 from datetime import datetime
+from typing import List
 from sqlalchemy import Column, Integer, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID, BYTEA, ARRAY
+from sqlalchemy.dialects.postgresql import UUID, BYTEA
 
 from ..core.database import Base
 
 
+def pack_lsh_hashes(hashes: List[int]) -> bytes:
+    """
+    Pack LSH hash values into fixed-width little-endian uint64 bytes
+    
+    64 bits hold any hash_size the LSH config accepts. Existing INTEGER[]
+    columns are converted by migrations/001_search_requests_lsh_hashes_bytea.sql.
+    """
+    try:
+        return struct.pack(f"<{len(hashes)}Q", *hashes)
+    except struct.error as e:
+        raise ValueError(f"LSH hashes must be unsigned 64-bit integers: {e}")
+
+
 class SearchRequest(Base):
     """Search request logging"""
     __tablename__ = "search_requests"
@@ -18,7 +33,7 @@ class SearchRequest(Base):
     
     # Search parameters
     encrypted_query = Column(BYTEA, nullable=False)
-    lsh_hashes = Column(ARRAY(Integer), nullable=False)
+    lsh_hashes = Column(BYTEA, nullable=False)  # num_tables * uint64, see pack_lsh_hashes
     top_k = Column(Integer, nullable=False)
     rerank_candidates = Column(Integer, nullable=False)
     
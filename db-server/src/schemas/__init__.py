@@ -15,7 +15,8 @@ from .secure_search import (
     InitRequest, InitResponse,
     AddEmbeddingRequest, AddEmbeddingResponse,
     SearchRequest, SearchResult, SearchResponse,
-    BatchAddEmbeddingRequest, BatchAddEmbeddingResponse
+    BatchAddEmbeddingRequest, BatchAddEmbeddingResponse,
+    AddEmbeddingBinaryItem, BatchAddEmbeddingBinaryRequest
 )
 
 __all__ = [
@@ -46,5 +47,7 @@ __all__ = [
     "SearchResult",
     "SearchResponse",
     "BatchAddEmbeddingRequest",
-    "BatchAddEmbeddingResponse"
+    "BatchAddEmbeddingResponse",
+    "AddEmbeddingBinaryItem",
+    "BatchAddEmbeddingBinaryRequest"
 ]
\ No newline at end of file
@@ -18,6 +18,7 @@ class InitRequest(BaseModel):
         "hash_size": 16, 
         "num_candidates": 100
     }
+    include_random_planes: bool = False  # Legacy: also ship the serialized planes
 
 
 class InitResponse(BaseModel):
@@ -27,7 +28,8 @@ class InitResponse(BaseModel):
     max_db_size: int
     supported_operations: List[str]
     lsh_config: Dict[str, Any]  # Server's LSH configuration
-    random_planes: Optional[str] = None  # Base64 encoded random planes for LSH
+    random_seed: int  # Seed reproducing the LSH planes via generate_random_planes
+    random_planes: Optional[str] = None  # Base64 encoded random planes (legacy, on request)
 
 
 # ============= ADD EMBEDDING =============
@@ -81,6 +83,20 @@ class BatchAddEmbeddingRequest(BaseModel):
     embeddings: List[AddEmbeddingRequest]
 
 
+class AddEmbeddingBinaryItem(BaseModel):
+    """Batch item for msgpack payloads, carrying the ciphertext as raw bytes"""
+    encrypted_embedding: bytes  # Serialized encrypted vector, no base64
+    lsh_hashes: List[int]
+    metadata: Optional[Dict[str, Any]] = None
+    embedding_id: Optional[str] = None
+
+
+class BatchAddEmbeddingBinaryRequest(BaseModel):
+    """Add multiple embeddings in batch (application/msgpack)"""
+    client_id: uuid.UUID
+    embeddings: List[AddEmbeddingBinaryItem]
+
+
 class BatchAddEmbeddingResponse(BaseModel):
     """Response for batch embedding addition"""
     batch_id: uuid.UUID
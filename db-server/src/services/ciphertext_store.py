@@ -0,0 +1,135 @@
+"""
+Ciphertext Store
+Append-only, mmap-backed storage for serialized encrypted vectors
+"""
+import os
+import mmap
+import threading
+import numpy as np
+from typing import Dict, Iterator, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CiphertextStore:
+    """
+    Serialized ciphertexts kept in an append-only file instead of the heap
+    
+    Each ciphertext is appended at the end of the file; offsets and lengths
+    live in growable int64 arrays indexed by row, and reads slice a
+    read-only mmap of the file so the OS page cache decides what stays in
+    RAM. Replacing a key appends a new record; the old bytes become garbage
+    until the store is rebuilt.
+    
+    Supports the subset of the dict interface the search service uses,
+    keyed by 16-byte embedding IDs. Call close() (or use the store as a
+    context manager) to release the file handle and mapping.
+    """
+    
+    _INITIAL_CAPACITY = 1024
+    
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "w+b")
+        self._size = 0
+        self._map: Optional[mmap.mmap] = None
+        self._mapped_size = 0
+        
+        self.row_index: Dict[bytes, int] = {}  # embedding_id.bytes -> row
+        self.offsets = np.empty(self._INITIAL_CAPACITY, dtype=np.int64)
+        self.lengths = np.empty(self._INITIAL_CAPACITY, dtype=np.int64)
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.row_index)
+    
+    def __enter__(self) -> "CiphertextStore":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.row_index
+    
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.row_index)
+    
+    def __setitem__(self, key: bytes, value: bytes):
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(value)
+            self._file.flush()
+            self._size += len(value)
+            
+            row = self.row_index.get(key)
+            if row is None:
+                row = len(self.row_index)
+                if row == len(self.offsets):
+                    self.offsets = np.concatenate((self.offsets, np.empty_like(self.offsets)))
+                    self.lengths = np.concatenate((self.lengths, np.empty_like(self.lengths)))
+            self.offsets[row] = offset
+            self.lengths[row] = len(value)
+            self.row_index[key] = row
+    
+    def __getitem__(self, key: bytes) -> bytes:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+    
+    def _mapped(self, end: int) -> mmap.mmap:
+        """Read-only map of the file covering at least [0, end)"""
+        current = self._map
+        if current is not None and end <= self._mapped_size:
+            return current
+        
+        with self._lock:
+            if self._map is None or end > self._mapped_size:
+                # Earlier maps stay valid for readers still holding them and
+                # are released once unreferenced
+                self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+                self._mapped_size = self._size
+            return self._map
+    
+    def get(self, key: bytes, default: Optional[bytes] = None) -> Optional[bytes]:
+        """Copy a stored ciphertext out of the mapped file"""
+        with self._lock:
+            row = self.row_index.get(key)
+            if row is None:
+                return default
+            offset = int(self.offsets[row])
+            end = offset + int(self.lengths[row])
+        
+        if end == offset:
+            return b""
+        return self._mapped(end)[offset:end]
+    
+    def close(self):
+        """
+        Release the mapping and the file handle
+        
+        Reads and writes fail afterwards; closing twice is a no-op.
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+                self._mapped_size = 0
+            self._file.close()
+    
+    def discard(self):
+        """
+        Delete the backing file
+        
+        The file stays readable through this object until it is garbage
+        collected, so searches still holding it finish safely.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        logger.info(f"Discarded ciphertext store {self.path}")
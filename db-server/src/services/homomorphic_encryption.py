@@ -2,15 +2,26 @@
 Homomorphic Encryption Service using TenSEAL
 Provides secure computation of similarity scores on encrypted vectors
 """
-import base64
 import json
+import os
+import threading
 import numpy as np
-from typing import List, Tuple, Optional, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Optional, Dict, Any, Union
 import tenseal as ts
+import pybase64
 import logging
 
+from ..core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# What an encrypted similarity decrypts to: the dot product in slot 0, or the
+# slot-wise products of a whole pack, one embedding_dim-wide block per vector
+SIMILARITY_DOT_PRODUCT = "dot_product"
+SIMILARITY_SLOT_PRODUCTS = "slot_products"
+
 
 class HomomorphicEncryptionService:
     """
@@ -18,31 +29,63 @@ class HomomorphicEncryptionService:
     Enables computation on encrypted vectors while preserving privacy
     """
     
-    def __init__(self):
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 cipher_cache_size: int = 256,
+                 cipher_cache_bytes: Optional[int] = None):
         self.context_cache: Dict[str, Any] = {}
         
+        # LRU of embedding_id -> (context, deserialized CKKSVector, serialized
+        # size); entries are only valid for the context object they were
+        # loaded under. Bounded by entry count and, optionally, total bytes
+        self.cipher_cache: "OrderedDict[str, Tuple[Any, ts.CKKSVector, int]]" = OrderedDict()
+        self.cipher_cache_size = cipher_cache_size
+        self.cipher_cache_bytes = cipher_cache_bytes
+        self._cipher_cache_used = 0
+        self._cipher_cache_lock = threading.Lock()
+        
+        # TenSEAL releases the GIL inside ciphertext ops, so threads scale
+        # the per-candidate dot products across cores
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="he-similarity"
+        )
+        
     def create_context(self, 
                       poly_modulus_degree: int = 8192,
                       coeff_mod_bit_sizes: List[int] = None,
-                      scale: float = 2**40) -> Any:
+                      scale: float = 2**40,
+                      symmetric: bool = False) -> Any:
         """
         Create a new TenSEAL context for CKKS scheme
         
+        Every call generates fresh keys; contexts (and so secret and galois
+        keys) are never shared between clients.
+        
         Args:
             poly_modulus_degree: Polynomial modulus degree (power of 2)
             coeff_mod_bit_sizes: Coefficient modulus bit sizes 
             scale: Scale for CKKS encoding
+            symmetric: Encrypt with the secret key instead of the public key.
+                      Roughly halves encryption cost; only usable where the
+                      context holds the secret key, and no public key is made.
             
         Returns:
             TenSEAL context for homomorphic operations
         """
         if coeff_mod_bit_sizes is None:
             coeff_mod_bit_sizes = [60, 40, 40, 60]
+        
+        encryption_type = (
+            ts.ENCRYPTION_TYPE.SYMMETRIC if symmetric else ts.ENCRYPTION_TYPE.ASYMMETRIC
+        )
             
         context = ts.context(
             ts.SCHEME_TYPE.CKKS,
             poly_modulus_degree=poly_modulus_degree,
-            coeff_mod_bit_sizes=coeff_mod_bit_sizes
+            coeff_mod_bit_sizes=coeff_mod_bit_sizes,
+            encryption_type=encryption_type
         )
         
         # Set the scale
@@ -51,17 +94,18 @@ class HomomorphicEncryptionService:
         # Generate galois keys for rotations (needed for dot product)
         context.generate_galois_keys()
         
-        logger.info(f"Created HE context with poly_degree={poly_modulus_degree}")
+        logger.info(f"Created HE context with poly_degree={poly_modulus_degree}, "
+                   f"symmetric={symmetric}")
         return context
     
     def serialize_context(self, context: Any) -> str:
         """Serialize context to base64 string"""
         context_bytes = context.serialize()
-        return base64.b64encode(context_bytes).decode('utf-8')
+        return pybase64.b64encode_as_string(context_bytes)
     
     def deserialize_context(self, context_b64: str) -> Any:
         """Deserialize context from base64 string"""
-        context_bytes = base64.b64decode(context_b64.encode('utf-8'))
+        context_bytes = pybase64.b64decode(context_b64, validate=False)
         return ts.context_from(context_bytes)
     
     def cache_context(self, client_id: str, context: Any):
@@ -84,15 +128,15 @@ class HomomorphicEncryptionService:
         Returns:
             Base64 encoded encrypted vector
         """
-        # Ensure vector is float64 for CKKS
-        vector = vector.astype(np.float64)
+        # Ensure vector is contiguous float64 for CKKS (no copy if it already is)
+        vector = np.ascontiguousarray(vector, dtype=np.float64)
         
-        # Encrypt the vector
-        encrypted_vector = ts.ckks_vector(context, vector.tolist())
+        # Encrypt the vector straight from the numpy buffer
+        encrypted_vector = ts.ckks_vector(context, vector)
         
         # Serialize and encode
         encrypted_bytes = encrypted_vector.serialize()
-        return base64.b64encode(encrypted_bytes).decode('utf-8')
+        return pybase64.b64encode_as_string(encrypted_bytes)
     
     def deserialize_encrypted_vector(self, 
                                    context: Any, 
@@ -107,9 +151,57 @@ class HomomorphicEncryptionService:
         Returns:
             TenSEAL CKKSVector object
         """
-        encrypted_bytes = base64.b64decode(encrypted_vector_b64.encode('utf-8'))
+        encrypted_bytes = pybase64.b64decode(encrypted_vector_b64, validate=False)
         return ts.ckks_vector_from(context, encrypted_bytes)
     
+    def get_or_load_ciphertext(self,
+                               embedding_id: str,
+                               context: Any,
+                               encrypted_vector: Union[bytes, str]) -> ts.CKKSVector:
+        """
+        Get a deserialized stored vector from the LRU, loading it on a miss
+        
+        Args:
+            embedding_id: Key of the stored vector
+            context: TenSEAL context the vector belongs to
+            encrypted_vector: Serialized vector, raw bytes or base64
+            
+        Returns:
+            TenSEAL CKKSVector object
+        """
+        with self._cipher_cache_lock:
+            entry = self.cipher_cache.get(embedding_id)
+            if entry is not None and entry[0] is context:
+                self.cipher_cache.move_to_end(embedding_id)
+                return entry[1]
+        
+        if isinstance(encrypted_vector, str):
+            encrypted_vector = pybase64.b64decode(encrypted_vector, validate=False)
+        vector = ts.ckks_vector_from(context, encrypted_vector)
+        
+        with self._cipher_cache_lock:
+            previous = self.cipher_cache.pop(embedding_id, None)
+            if previous is not None:
+                self._cipher_cache_used -= previous[2]
+            self.cipher_cache[embedding_id] = (context, vector, len(encrypted_vector))
+            self._cipher_cache_used += len(encrypted_vector)
+            while len(self.cipher_cache) > self.cipher_cache_size or (
+                self.cipher_cache_bytes is not None
+                and self._cipher_cache_used > self.cipher_cache_bytes
+                and len(self.cipher_cache) > 1
+            ):
+                _, (_, _, nbytes) = self.cipher_cache.popitem(last=False)
+                self._cipher_cache_used -= nbytes
+        
+        return vector
+    
+    def evict_ciphertext(self, embedding_id: str):
+        """Drop a stored vector from the LRU, e.g. after it was replaced"""
+        with self._cipher_cache_lock:
+            entry = self.cipher_cache.pop(embedding_id, None)
+            if entry is not None:
+                self._cipher_cache_used -= entry[2]
+    
     def compute_encrypted_similarity(self, 
                                    context: Any,
                                    encrypted_query: str,
@@ -127,22 +219,91 @@ class HomomorphicEncryptionService:
             Base64 encoded encrypted similarity score
         """
         try:
-            # Deserialize encrypted vectors
             query_vec = self.deserialize_encrypted_vector(context, encrypted_query)
-            stored_vec = self.deserialize_encrypted_vector(context, encrypted_vector)
+            stored_bytes = pybase64.b64decode(encrypted_vector, validate=False)
             
-            # Compute homomorphic dot product
-            # This performs encrypted multiplication and sum
-            dot_product = query_vec.dot(stored_vec)
-            
-            # Serialize the result
-            result_bytes = dot_product.serialize()
-            return base64.b64encode(result_bytes).decode('utf-8')
+            result_bytes = self.compute_encrypted_similarity_bytes(
+                context, query_vec, stored_bytes
+            )
+            return pybase64.b64encode_as_string(result_bytes)
             
         except Exception as e:
             logger.error(f"Failed to compute encrypted similarity: {e}")
             raise
     
+    def compute_encrypted_similarity_bytes(self,
+                                         context: Any,
+                                         query_vec: ts.CKKSVector,
+                                         encrypted_vector: bytes) -> bytes:
+        """
+        Compute similarity against an already deserialized query
+        Service-internal variant that skips base64 on both sides
+        
+        Args:
+            context: TenSEAL context
+            query_vec: Deserialized encrypted query vector
+            encrypted_vector: Serialized encrypted stored vector
+            
+        Returns:
+            Serialized encrypted similarity score
+        """
+        stored_vec = ts.ckks_vector_from(context, encrypted_vector)
+        
+        # Compute homomorphic dot product
+        # This performs encrypted multiplication and sum
+        return query_vec.dot(stored_vec).serialize()
+    
+    def compute_similarities_bytes(self,
+                                   context: Any,
+                                   query_vec: ts.CKKSVector,
+                                   stored_vectors: List[Union[bytes, ts.CKKSVector, None]],
+                                   embedding_ids: Optional[List[Any]] = None) -> List[Optional[bytes]]:
+        """
+        Compute similarities for many stored vectors in a few pool tasks
+        
+        The candidates are split into one contiguous chunk per worker and each
+        chunk runs as a tight loop over TenSEAL's native ops, so Python-side
+        dispatch is paid per worker instead of per candidate.
+        
+        Args:
+            context: TenSEAL context
+            query_vec: Deserialized encrypted query vector
+            stored_vectors: Serialized or deserialized stored vectors; None
+                           entries are skipped
+            embedding_ids: Optional IDs parallel to stored_vectors; when
+                          given, serialized vectors go through the LRU
+            
+        Returns:
+            Serialized encrypted similarity per stored vector, None where
+            the vector was missing or the computation failed
+        """
+        def compute_chunk(chunk: List[Tuple[Any, Union[bytes, ts.CKKSVector, None]]]) -> List[Optional[bytes]]:
+            dot = query_vec.dot
+            out = []
+            for embedding_id, stored_vec in chunk:
+                if stored_vec is None:
+                    out.append(None)
+                    continue
+                try:
+                    if isinstance(stored_vec, bytes):
+                        if embedding_id is not None:
+                            stored_vec = self.get_or_load_ciphertext(embedding_id, context, stored_vec)
+                        else:
+                            stored_vec = ts.ckks_vector_from(context, stored_vec)
+                    out.append(dot(stored_vec).serialize())
+                except Exception as e:
+                    logger.warning("Failed to compute similarity: %s", e)
+                    out.append(None)
+            return out
+        
+        if not stored_vectors:
+            return []
+        
+        jobs = list(zip(embedding_ids or [None] * len(stored_vectors), stored_vectors))
+        chunk_size = -(-len(jobs) // self.max_workers)
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        return [result for chunk in self.executor.map(compute_chunk, chunks) for result in chunk]
+    
     def batch_encrypt_vectors(self, 
                             context: Any, 
                             vectors: List[np.ndarray]) -> List[str]:
@@ -175,7 +336,8 @@ class HomomorphicEncryptionService:
     def batch_compute_similarities(self,
                                  context: Any,
                                  encrypted_query: str,
-                                 encrypted_vectors: List[str]) -> List[str]:
+                                 encrypted_vectors: List[str],
+                                 embedding_ids: Optional[List[str]] = None) -> List[str]:
         """
         Batch compute similarities for multiple encrypted vectors
         
@@ -183,32 +345,220 @@ class HomomorphicEncryptionService:
             context: TenSEAL context
             encrypted_query: Base64 encoded encrypted query
             encrypted_vectors: List of base64 encoded encrypted vectors
+            embedding_ids: Optional IDs parallel to encrypted_vectors; when
+                          given, deserialized vectors are reused via the LRU
             
         Returns:
             List of base64 encoded encrypted similarity scores
         """
-        similarities = []
+        # Deserialize the query once for the whole batch
+        query_vec = self.deserialize_encrypted_vector(context, encrypted_query)
         
-        for i, encrypted_vec in enumerate(encrypted_vectors):
+        def compute_one(job: Tuple[int, Optional[str]]) -> Optional[str]:
+            i, encrypted_vec = job
+            if encrypted_vec is None:
+                return None
             try:
-                if encrypted_vec is None:
-                    similarities.append(None)
-                    continue
-                    
-                similarity = self.compute_encrypted_similarity(
-                    context, encrypted_query, encrypted_vec
-                )
-                similarities.append(similarity)
-                
-                if (i + 1) % 50 == 0:
-                    logger.info(f"Computed {i + 1}/{len(encrypted_vectors)} similarities")
-                    
+                if embedding_ids is not None:
+                    stored_vec = self.get_or_load_ciphertext(
+                        embedding_ids[i], context, encrypted_vec
+                    )
+                    result_bytes = query_vec.dot(stored_vec).serialize()
+                else:
+                    stored_bytes = pybase64.b64decode(encrypted_vec, validate=False)
+                    result_bytes = self.compute_encrypted_similarity_bytes(
+                        context, query_vec, stored_bytes
+                    )
+                return pybase64.b64encode_as_string(result_bytes)
             except Exception as e:
                 logger.error(f"Failed to compute similarity {i}: {e}")
-                similarities.append(None)
+                return None
+        
+        similarities = []
+        
+        for i, similarity in enumerate(self.executor.map(compute_one, enumerate(encrypted_vectors))):
+            similarities.append(similarity)
+            
+            if (i + 1) % 50 == 0:
+                logger.info(f"Computed {i + 1}/{len(encrypted_vectors)} similarities")
         
         return similarities
     
+    def get_slot_count(self, context: Any) -> int:
+        """Number of CKKS slots in a ciphertext (poly_modulus_degree / 2)"""
+        parms = context.seal_context().data.key_context_data().parms()
+        return parms.poly_modulus_degree() // 2
+    
+    def get_packing_capacity(self, context: Any, embedding_dim: int) -> int:
+        """Number of embedding_dim vectors that fit in one ciphertext"""
+        return self.get_slot_count(context) // embedding_dim
+    
+    def encrypt_packed_batch(self,
+                             context: Any,
+                             vectors: List[np.ndarray]) -> List[str]:
+        """
+        Encrypt vectors packed side by side into as few ciphertexts as possible
+        
+        Each ciphertext holds get_packing_capacity() vectors back to back;
+        the last one is zero-padded to the same length so every pack can be
+        multiplied with the same replicated query.
+        
+        Args:
+            context: TenSEAL context
+            vectors: Equal-length numpy arrays to encrypt
+            
+        Returns:
+            List of base64 encoded packed ciphertexts
+        """
+        if not vectors:
+            return []
+        
+        embedding_dim = len(vectors[0])
+        capacity = self.get_packing_capacity(context, embedding_dim)
+        if capacity == 0:
+            raise ValueError(f"Embedding dimension {embedding_dim} exceeds ciphertext slot count")
+        
+        packed_vectors = []
+        for start in range(0, len(vectors), capacity):
+            block = np.zeros(capacity * embedding_dim, dtype=np.float64)
+            chunk = vectors[start:start + capacity]
+            block[:len(chunk) * embedding_dim] = np.concatenate(chunk)
+            
+            encrypted = ts.ckks_vector(context, block)
+            packed_vectors.append(pybase64.b64encode_as_string(encrypted.serialize()))
+        
+        return packed_vectors
+    
+    def encrypt_replicated_query(self, context: Any, query: np.ndarray) -> str:
+        """
+        Encrypt a query tiled once per packed slot block
+        
+        Args:
+            context: TenSEAL context
+            query: Query vector
+            
+        Returns:
+            Base64 encoded encrypted replicated query
+        """
+        capacity = self.get_packing_capacity(context, len(query))
+        return self.encrypt_vector(context, np.tile(query, capacity))
+    
+    def compute_packed_similarities(self,
+                                    context: Any,
+                                    encrypted_query: str,
+                                    packed_vector: str) -> str:
+        """
+        Compute similarities between a replicated query and a packed ciphertext
+        
+        One ciphertext multiplication covers every vector in the pack. The
+        result holds the slot-wise products (SIMILARITY_SLOT_PRODUCTS), not
+        dot products: each embedding_dim-wide block sums to one similarity,
+        which the secret key holder reduces after decryption (see
+        decrypt_packed_similarities). TenSEAL vectors cannot be rotated, so
+        the block reduction cannot be done homomorphically here.
+        
+        Args:
+            context: TenSEAL context
+            encrypted_query: Base64 encoded replicated query
+            packed_vector: Base64 encoded packed stored vectors
+            
+        Returns:
+            Base64 encoded encrypted slot-wise products
+        """
+        try:
+            query_vec = self.deserialize_encrypted_vector(context, encrypted_query)
+            packed_vec = self.deserialize_encrypted_vector(context, packed_vector)
+            
+            product = query_vec * packed_vec
+            return pybase64.b64encode_as_string(product.serialize())
+            
+        except Exception as e:
+            logger.error(f"Failed to compute packed similarities: {e}")
+            raise
+    
+    def decrypt_packed_similarities(self,
+                                    context: Any,
+                                    packed_result: str,
+                                    embedding_dim: int,
+                                    count: int) -> np.ndarray:
+        """
+        Decrypt a compute_packed_similarities result into per-vector scores
+        Requires a context holding the secret key
+        
+        Args:
+            context: TenSEAL context with secret key
+            packed_result: Base64 encoded slot-wise products
+            embedding_dim: Dimension of the packed vectors
+            count: Number of real (non-padding) vectors in the pack
+            
+        Returns:
+            Similarity scores, shape (count,)
+        """
+        products = np.asarray(self.deserialize_encrypted_vector(context, packed_result).decrypt())
+        return products[:count * embedding_dim].reshape(count, embedding_dim).sum(axis=1)
+    
+    def pack_encrypted_vectors(self,
+                               context: Any,
+                               encrypted_vectors: List[bytes]) -> ts.CKKSVector:
+        """
+        Pack already encrypted vectors side by side into one ciphertext
+        Uses one multiplicative level
+        
+        Args:
+            context: TenSEAL context
+            encrypted_vectors: Serialized encrypted vectors of equal size
+            
+        Returns:
+            Packed TenSEAL CKKSVector
+        """
+        vectors = [
+            ts.ckks_vector_from(context, encrypted_vector)
+            for encrypted_vector in encrypted_vectors
+        ]
+        return ts.CKKSVector.pack_vectors(vectors)
+    
+    def compute_batched_similarity(self,
+                                   context: Any,
+                                   query_vec: ts.CKKSVector,
+                                   packed_vec: ts.CKKSVector,
+                                   count: int) -> str:
+        """
+        Compute similarities between a query and every vector in a pack
+        
+        The query is replicated count times (one level) and multiplied
+        slot-wise with the pack (one level). As with
+        compute_packed_similarities, the result is SIMILARITY_SLOT_PRODUCTS:
+        each embedding_dim-wide block sums to one similarity after decryption.
+        
+        Args:
+            context: TenSEAL context
+            query_vec: Deserialized encrypted query vector
+            packed_vec: Pack built by pack_encrypted_vectors
+            count: Number of vectors in the pack
+            
+        Returns:
+            Base64 encoded encrypted slot-wise products
+        """
+        return pybase64.b64encode_as_string(
+            self.compute_batched_similarity_bytes(context, query_vec, packed_vec, count)
+        )
+    
+    def compute_batched_similarity_bytes(self,
+                                         context: Any,
+                                         query_vec: ts.CKKSVector,
+                                         packed_vec: ts.CKKSVector,
+                                         count: int) -> bytes:
+        """
+        Compute similarities between a query and every vector in a pack
+        Service-internal variant of compute_batched_similarity without base64
+        
+        Returns:
+            Serialized encrypted slot-wise products
+        """
+        replicated_query = ts.CKKSVector.pack_vectors([query_vec] * count)
+        product = replicated_query * packed_vec
+        return product.serialize()
+    
     def clear_context_cache(self, client_id: Optional[str] = None):
         """
         Clear cached contexts
@@ -218,12 +568,23 @@ class HomomorphicEncryptionService:
                       If None, clear all contexts.
         """
         if client_id:
-            self.context_cache.pop(client_id, None)
+            context = self.context_cache.pop(client_id, None)
+            if context is not None:
+                with self._cipher_cache_lock:
+                    stale = [key for key, (ctx, _, _) in self.cipher_cache.items() if ctx is context]
+                    for key in stale:
+                        self._cipher_cache_used -= self.cipher_cache.pop(key)[2]
             logger.info(f"Cleared cached context for client {client_id}")
         else:
             self.context_cache.clear()
+            with self._cipher_cache_lock:
+                self.cipher_cache.clear()
+                self._cipher_cache_used = 0
             logger.info("Cleared all cached contexts")
 
 
 # Global service instance
-he_service = HomomorphicEncryptionService()
\ No newline at end of file
+he_service = HomomorphicEncryptionService(
+    cipher_cache_size=settings.HE_CIPHER_CACHE_SIZE,
+    cipher_cache_bytes=settings.HE_CIPHER_CACHE_BYTES
+)
\ No newline at end of file
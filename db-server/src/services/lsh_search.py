@@ -3,16 +3,30 @@ Locality-Sensitive Hashing (LSH) Service
 Provides efficient approximate similarity search for high-dimensional vectors
 """
 import uuid
+import struct
 import numpy as np
-import pickle
-import base64
-import hashlib
-from typing import List, Tuple, Set, Dict, Optional
+import pybase64
+import xxhash
+import threading
+from functools import lru_cache
+from itertools import combinations, islice
+from typing import List, Tuple, Dict, Optional, Iterator
 from dataclasses import dataclass
 import logging
 
+from .lsh_utils import count_matching_bits, count_matching_bits_batch, count_range_hits
+
 logger = logging.getLogger(__name__)
 
+# Header for serialized planes: (num_tables, hash_size, embedding_dim)
+_PLANES_HEADER_FORMAT = '<III'
+_PLANES_HEADER_SIZE = struct.calcsize(_PLANES_HEADER_FORMAT)
+
+# Default buckets probed per table in multi-probe search: the hash, its 16
+# one-bit neighbours at hash_size=16, then the first two-bit neighbours.
+# Radius 2 alone is 137 probes per table at that size.
+DEFAULT_MAX_PROBES = 32
+
 
 @dataclass
 class LSHConfig:
@@ -21,6 +35,296 @@ class LSHConfig:
     hash_size: int = 16           # Number of bits per hash
     embedding_dim: int = 384      # Dimension of input vectors
     random_seed: int = 42         # Seed for reproducible random planes
+    
+    def __post_init__(self):
+        # Hashes are packed into uint64, and indexed as uint64 keys together
+        # with their table index
+        if not 0 < self.hash_size <= 64:
+            raise ValueError(f"hash_size must be between 1 and 64, got {self.hash_size}")
+        if (max(self.num_tables, 1) - 1).bit_length() + self.hash_size > 64:
+            raise ValueError(f"num_tables={self.num_tables} and hash_size={self.hash_size} "
+                             f"do not fit a 64-bit (table, hash) key")
+
+
+def _pack_sign_bits(bits: np.ndarray) -> np.ndarray:
+    """
+    Pack a (..., num_tables, hash_size) boolean array into one integer per table
+    
+    Bit i of each row has weight 2**i. Rows are packed little-endian and
+    zero-padded to 8 bytes so they can be reinterpreted as uint64.
+    """
+    packed = np.packbits(bits, axis=-1, bitorder='little')
+    if packed.shape[-1] < 8:
+        pad = [(0, 0)] * (packed.ndim - 1) + [(0, 8 - packed.shape[-1])]
+        packed = np.pad(packed, pad)
+    return np.ascontiguousarray(packed).view('<u8')[..., 0]
+
+
+def _hash_mask(hash_size: int) -> np.uint64:
+    """Mask selecting the low hash_size bits of a uint64 hash"""
+    return np.uint64((1 << hash_size) - 1)
+
+
+def multi_probe(hash_value: int,
+                hash_size: int,
+                radius: int = 2,
+                max_probes: Optional[int] = None) -> Iterator[int]:
+    """
+    Yield neighbouring bucket keys of an LSH hash for multi-probe lookup
+    
+    The hash itself comes first, then every key differing in one bit, then
+    in two bits, and so on up to radius flipped bits. Probing nearby buckets
+    recovers neighbours that fell just across a hyperplane, giving the
+    recall of many more tables with far fewer of them.
+    
+    Args:
+        hash_value: Hash to perturb
+        hash_size: Number of bits per hash
+        radius: Maximum number of flipped bits
+        max_probes: Stop after this many keys (None = all within radius)
+    """
+    def probes() -> Iterator[int]:
+        for flips in range(min(radius, hash_size) + 1):
+            for bits in combinations(range(hash_size), flips):
+                mask = 0
+                for bit in bits:
+                    mask |= 1 << bit
+                yield hash_value ^ mask
+    
+    return islice(probes(), max_probes)
+
+
+@lru_cache(maxsize=32)
+def _probe_masks(hash_size: int, radius: int, max_probes: Optional[int]) -> np.ndarray:
+    """XOR masks for multi_probe, so probes for any hash are hash ^ masks"""
+    masks = np.fromiter(multi_probe(0, hash_size, radius, max_probes), dtype=np.uint64)
+    masks.flags.writeable = False
+    return masks
+
+
+class LSHIndex:
+    """
+    Struct-of-arrays LSH index
+    
+    Every (table, hash) bucket is a single packed uint64 key,
+    table_idx << hash_size | hash_value, kept in one sorted array with a
+    parallel array of row indices. A lookup for all tables (and probes) is
+    then one pair of vectorized binary searches over contiguous memory.
+    Rows map back to embedding IDs (16-byte UUID keys) through
+    embedding_ids. Inserts are
+    buffered in growable uint64/uint32 arrays (doubled when full) and merged
+    into the sorted arrays on the next lookup.
+    """
+    
+    _INITIAL_PENDING_CAPACITY = 256
+    
+    def __init__(self, num_tables: int, hash_size: int = 16):
+        if (max(num_tables, 1) - 1).bit_length() + hash_size > 64:
+            raise ValueError(f"{num_tables} tables of {hash_size}-bit hashes do not fit a uint64 key")
+        
+        self.num_tables = num_tables
+        self.hash_size = hash_size
+        self.embedding_ids: List[bytes] = []  # row -> embedding_id.bytes
+        self.row_index: Dict[bytes, int] = {}  # embedding_id.bytes -> row
+        self.keys = np.empty(0, dtype=np.uint64)  # sorted packed (table, hash) keys
+        self.rows = np.empty(0, dtype=np.uint32)  # row of each key
+        self._hash_mask = _hash_mask(hash_size)
+        self._table_keys = np.arange(num_tables, dtype=np.uint64) << np.uint64(hash_size)
+        self._pending_keys = np.empty(self._INITIAL_PENDING_CAPACITY, dtype=np.uint64)
+        self._pending_rows = np.empty(self._INITIAL_PENDING_CAPACITY, dtype=np.uint32)
+        self._pending_count = 0
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.embedding_ids)
+    
+    def _row_for(self, embedding_id: bytes) -> int:
+        row = self.row_index.get(embedding_id)
+        if row is None:
+            row = len(self.embedding_ids)
+            self.embedding_ids.append(embedding_id)
+            self.row_index[embedding_id] = row
+        return row
+    
+    def _pack_keys(self, hashes: np.ndarray) -> np.ndarray:
+        """Packed keys for hashes whose first axis is the table, from table 0"""
+        table_keys = self._table_keys[:len(hashes)].reshape((-1,) + (1,) * (hashes.ndim - 1))
+        return table_keys | (hashes & self._hash_mask)
+    
+    def _push_pending(self, keys: np.ndarray, row: int):
+        """Append keys for a row, doubling the insert buffers when full"""
+        count = self._pending_count
+        needed = count + len(keys)
+        capacity = len(self._pending_keys)
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            pending_keys = np.empty(capacity, dtype=np.uint64)
+            pending_rows = np.empty(capacity, dtype=np.uint32)
+            pending_keys[:count] = self._pending_keys[:count]
+            pending_rows[:count] = self._pending_rows[:count]
+            self._pending_keys = pending_keys
+            self._pending_rows = pending_rows
+        
+        self._pending_keys[count:needed] = keys
+        self._pending_rows[count:needed] = row
+        self._pending_count = needed
+    
+    def _discard(self, row: int, table_idx: Optional[int] = None):
+        """
+        Remove a row's entries, from every table or only from table_idx
+        
+        Must be called with the lock held. Sorted arrays are replaced, not
+        mutated, so snapshots returned by _flush stay valid.
+        """
+        def keep(keys: np.ndarray, rows: np.ndarray) -> np.ndarray:
+            mask = rows != row
+            if table_idx is not None:
+                mask |= (keys & ~self._hash_mask) != self._table_keys[table_idx]
+            return mask
+        
+        mask = keep(self.keys, self.rows)
+        if not mask.all():
+            self.keys = self.keys[mask]
+            self.rows = self.rows[mask]
+        
+        count = self._pending_count
+        mask = keep(self._pending_keys[:count], self._pending_rows[:count])
+        if not mask.all():
+            kept = int(mask.sum())
+            self._pending_keys[:kept] = self._pending_keys[:count][mask]
+            self._pending_rows[:kept] = self._pending_rows[:count][mask]
+            self._pending_count = kept
+    
+    def add(self, embedding_id: bytes, lsh_hashes: List[int]):
+        """
+        Index an embedding under one hash per table
+        
+        Re-adding an indexed embedding replaces its previous hashes, so each
+        row holds at most one entry per table.
+        """
+        hashes = np.asarray(lsh_hashes[:self.num_tables], dtype=np.uint64)
+        keys = self._pack_keys(hashes)
+        with self._lock:
+            row = self.row_index.get(embedding_id)
+            if row is not None:
+                self._discard(row)
+            self._push_pending(keys, self._row_for(embedding_id))
+    
+    def add_hash(self, embedding_id: bytes, table_idx: int, hash_value: int):
+        """Index a single (table, hash) entry for an embedding, replacing its previous hash in that table"""
+        if table_idx >= self.num_tables:
+            return
+        key = self._table_keys[table_idx] | np.uint64(int(hash_value) & int(self._hash_mask))
+        with self._lock:
+            row = self.row_index.get(embedding_id)
+            if row is not None:
+                self._discard(row, table_idx)
+            self._push_pending(np.array([key], dtype=np.uint64), self._row_for(embedding_id))
+    
+    def _flush(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Merge buffered inserts into the sorted key array
+        
+        Returns:
+            Tuple of (keys, rows) as of the flush, taken under the lock.
+            Flushes replace rather than mutate these arrays, so readers
+            should use this snapshot instead of re-reading self.keys and
+            self.rows, which a concurrent add plus flush may swap out.
+        """
+        with self._lock:
+            count = self._pending_count
+            if not count:
+                return self.keys, self.rows
+            
+            keys = np.concatenate((self.keys, self._pending_keys[:count]))
+            rows = np.concatenate((self.rows, self._pending_rows[:count]))
+            
+            # Stable sort of an already sorted run plus a short tail is ~linear
+            order = np.argsort(keys, kind='stable')
+            self.keys = keys[order]
+            self.rows = rows[order]
+            self._pending_count = 0
+            return self.keys, self.rows
+    
+    def lookup_ranges(self,
+                      query_hashes: List[int],
+                      probe_masks: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the posting-list ranges of rows colliding with the query
+        
+        Args:
+            query_hashes: One hash per table
+            probe_masks: XOR masks of the buckets to probe per table
+                        (see multi_probe); None probes only the exact bucket
+        
+        Returns:
+            Tuple of (keys, rows, lo, hi): a consistent snapshot of the
+            index arrays and the non-empty ranges [lo, hi) into that rows
+            array. Later adds never invalidate the snapshot.
+        """
+        index_keys, index_rows = self._flush()
+        
+        query = np.asarray(query_hashes[:self.num_tables], dtype=np.uint64)
+        if probe_masks is None:
+            probe_masks = np.zeros(1, dtype=np.uint64)
+        
+        # Bucket bounds for every probe of every table at once: searchsorted
+        # over keys and keys + 1 (key + 1 wraps only for the all-ones key).
+        # Masks are distinct, so each row matches at most one probe per table
+        keys = self._pack_keys(query[:, None] ^ probe_masks[None, :]).ravel()
+        upper = keys + np.uint64(1)
+        lo = np.searchsorted(index_keys, keys)
+        hi = np.searchsorted(index_keys, upper)
+        hi[upper == 0] = len(index_keys)
+        
+        hit = hi > lo
+        return index_keys, index_rows, lo[hit], hi[hit]
+    
+    def lookup(self, query_hashes: List[int], probe_masks: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Find rows colliding with the query
+        
+        Args:
+            query_hashes: One hash per table
+            probe_masks: XOR masks of the buckets to probe per table
+                        (see multi_probe); None probes only the exact bucket
+        
+        Returns:
+            Row indices, one entry per (row, table) collision
+        """
+        _, rows, lo, hi = self.lookup_ranges(query_hashes, probe_masks)
+        
+        # Gather the hit ranges [lo, hi) without a Python loop
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.uint32)
+        range_starts = np.cumsum(lengths) - lengths
+        positions = np.arange(total) + np.repeat(lo - range_starts, lengths)
+        return rows[positions]
+    
+    def bucket_count(self) -> int:
+        """Number of distinct non-empty (table, hash) buckets"""
+        keys, _ = self._flush()
+        if not keys.size:
+            return 0
+        return int(np.count_nonzero(np.diff(keys)) + 1)
+    
+    def iter_buckets(self) -> Iterator[Tuple[int, int, List[uuid.UUID]]]:
+        """Yield (table_idx, hash_value, embedding_ids) for each non-empty bucket"""
+        keys, rows = self._flush()
+        if not keys.size:
+            return
+        
+        starts = np.flatnonzero(np.r_[True, np.diff(keys) != 0])
+        ends = np.r_[starts[1:], keys.size]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            key = int(keys[start])
+            bucket_rows = rows[start:end].tolist()
+            yield key >> self.hash_size, key & int(self._hash_mask), [
+                uuid.UUID(bytes=self.embedding_ids[row]) for row in bucket_rows
+            ]
 
 
 class LSHSearchService:
@@ -32,6 +336,7 @@ class LSHSearchService:
     def __init__(self):
         self.client_configs: Dict[str, LSHConfig] = {}
         self.random_planes_cache: Dict[str, np.ndarray] = {}
+        self.flat_planes_cache: Dict[str, np.ndarray] = {}  # (num_tables*hash_size, embedding_dim) views
     
     def create_lsh_config(self, 
                          client_id: str,
@@ -54,7 +359,7 @@ class LSHSearchService:
         """
         if random_seed is None:
             # Create deterministic seed from client ID
-            random_seed = int(hashlib.md5(client_id.encode()).hexdigest()[:8], 16)
+            random_seed = xxhash.xxh3_64_intdigest(client_id.encode())
         
         config = LSHConfig(
             num_tables=num_tables,
@@ -79,30 +384,31 @@ class LSHSearchService:
         Returns:
             Random planes array of shape (num_tables, hash_size, embedding_dim)
         """
-        np.random.seed(config.random_seed)
+        # Per-call PCG64 generator: re-entrant, unlike the global np.random state
+        rng = np.random.default_rng(config.random_seed)
         
-        # Generate random hyperplanes
+        # Generate random hyperplanes straight into one float32 buffer
         # Each plane is a unit vector in embedding_dim space
-        random_planes = np.random.randn(
-            config.num_tables, 
-            config.hash_size, 
-            config.embedding_dim
+        random_planes = np.empty(
+            (config.num_tables, config.hash_size, config.embedding_dim),
+            dtype=np.float32
         )
+        rng.standard_normal(dtype=np.float32, out=random_planes)
         
-        # Normalize each hyperplane to unit length
-        for table_idx in range(config.num_tables):
-            for bit_idx in range(config.hash_size):
-                plane = random_planes[table_idx, bit_idx]
-                norm = np.linalg.norm(plane)
-                if norm > 0:
-                    random_planes[table_idx, bit_idx] = plane / norm
+        # Normalize each hyperplane to unit length, in place. Clients regenerate
+        # the planes from the seed, so this must stay bit-identical to theirs
+        norms = np.linalg.norm(random_planes, axis=-1, keepdims=True)
+        np.divide(random_planes, norms, out=random_planes, where=norms > 0)
         
         logger.info(f"Generated random planes: {random_planes.shape}")
         return random_planes
     
     def cache_random_planes(self, client_id: str, random_planes: np.ndarray):
         """Cache random planes for a client"""
+        # Hashing runs in float32 end to end
+        random_planes = np.ascontiguousarray(random_planes, dtype=np.float32)
         self.random_planes_cache[client_id] = random_planes
+        self.flat_planes_cache[client_id] = random_planes.reshape(-1, random_planes.shape[-1])
         logger.info(f"Cached random planes for client {client_id}")
     
     def get_random_planes(self, client_id: str) -> Optional[np.ndarray]:
@@ -110,14 +416,23 @@ class LSHSearchService:
         return self.random_planes_cache.get(client_id)
     
     def serialize_random_planes(self, random_planes: np.ndarray) -> str:
-        """Serialize random planes to base64 string"""
-        planes_bytes = pickle.dumps(random_planes)
-        return base64.b64encode(planes_bytes).decode('utf-8')
+        """
+        Serialize random planes to base64 string
+        
+        Layout: little-endian (num_tables, hash_size, embedding_dim) uint32
+        header followed by the planes as raw little-endian float32.
+        """
+        header = struct.pack(_PLANES_HEADER_FORMAT, *random_planes.shape)
+        body = np.ascontiguousarray(random_planes, dtype='<f4').tobytes()
+        return pybase64.b64encode_as_string(header + body)
     
     def deserialize_random_planes(self, planes_b64: str) -> np.ndarray:
         """Deserialize random planes from base64 string"""
-        planes_bytes = base64.b64decode(planes_b64.encode('utf-8'))
-        return pickle.loads(planes_bytes)
+        planes_bytes = pybase64.b64decode(planes_b64, validate=False)
+        shape = struct.unpack_from(_PLANES_HEADER_FORMAT, planes_bytes)
+        return np.frombuffer(
+            planes_bytes, dtype='<f4', offset=_PLANES_HEADER_SIZE
+        ).reshape(shape)
     
     def compute_lsh_hashes(self, 
                           client_id: str, 
@@ -130,86 +445,133 @@ class LSHSearchService:
             vector: Input vector to hash
             
         Returns:
-            List of LSH hash values (one per table)
+            List of LSH hash values (one per table), each below 2**hash_size
         """
         # Get cached random planes
         random_planes = self.get_random_planes(client_id)
         if random_planes is None:
             raise ValueError(f"No random planes found for client {client_id}")
         
-        # Normalize input vector
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
-        
         config = self.client_configs[client_id]
-        hashes = []
+        flat_planes = self.flat_planes_cache[client_id]
         
-        for table_idx in range(config.num_tables):
-            # Compute hash for this table
-            hash_bits = []
-            
-            for bit_idx in range(config.hash_size):
-                # Dot product with random hyperplane
-                dot_product = np.dot(vector, random_planes[table_idx, bit_idx])
-                # Hash bit is 1 if positive, 0 if negative
-                hash_bits.append(1 if dot_product >= 0 else 0)
+        # Sign bits are scale-invariant, so the vector needs no normalization;
+        # project onto every hyperplane with a single GEMV call
+        dots = flat_planes @ np.asarray(vector, dtype=flat_planes.dtype)
+        bits = (dots >= 0).reshape(config.num_tables, config.hash_size)
+        
+        return _pack_sign_bits(bits).tolist()
+    
+    def compute_lsh_hashes_batch(self,
+                                 client_id: str,
+                                 vectors: np.ndarray) -> np.ndarray:
+        """
+        Compute LSH hashes for many vectors with a single GEMM
+        
+        Args:
+            client_id: Client identifier
+            vectors: Input vectors, shape (M, embedding_dim)
             
-            # Convert bit array to integer hash value
-            hash_value = sum(bit * (2 ** i) for i, bit in enumerate(hash_bits))
-            hashes.append(hash_value)
+        Returns:
+            uint64 array of shape (M, num_tables)
+        """
+        flat_planes = self.flat_planes_cache.get(client_id)
+        if flat_planes is None:
+            raise ValueError(f"No random planes found for client {client_id}")
         
-        return hashes
+        config = self.client_configs[client_id]
+        vectors = np.asarray(vectors, dtype=flat_planes.dtype)
+        
+        # (M, D) @ (D, T*B); no normalization needed since only signs are kept
+        dots = vectors @ flat_planes.T
+        bits = (dots >= 0).reshape(len(vectors), config.num_tables, config.hash_size)
+        
+        return _pack_sign_bits(bits)
     
-    def find_candidate_embeddings(self,
-                                client_id: str,
-                                query_hashes: List[int],
-                                stored_hashes: Dict[Tuple[int, int], Set[uuid.UUID]],
-                                min_matches: int = 1) -> Set[uuid.UUID]:
+    def find_candidate_rows(self,
+                            client_id: str,
+                            query_hashes: List[int],
+                            stored_hashes: LSHIndex,
+                            min_matches: int = 1,
+                            probe_radius: int = 0,
+                            max_probes: Optional[int] = DEFAULT_MAX_PROBES,
+                            max_results: Optional[int] = None) -> np.ndarray:
         """
-        Find candidate embeddings using LSH hash matching
+        Find candidate rows of an LSH index using hash matching
         
         Args:
             client_id: Client identifier
             query_hashes: LSH hashes of query vector
-            stored_hashes: Dictionary mapping (table_idx, hash_value) -> set of embedding_ids
+            stored_hashes: Client's LSH index
             min_matches: Minimum number of table matches required
+            probe_radius: Also probe buckets up to this many flipped bits
+                         away in each table (multi-probe LSH)
+            max_probes: Cap on buckets probed per table (None = every
+                       bucket within probe_radius)
+            max_results: Only rank and return this many best candidates
             
         Returns:
-            Set of candidate embedding IDs
+            Index row numbers, most table collisions first; map them to
+            16-byte embedding ID keys through stored_hashes.embedding_ids
         """
         config = self.client_configs.get(client_id)
         if not config:
             raise ValueError(f"No LSH config found for client {client_id}")
         
-        # Count matches for each embedding
-        embedding_matches: Dict[uuid.UUID, int] = {}
+        # Union the colliding posting-list ranges and apply the min_matches
+        # threshold in one compiled pass, without materializing the hits
+        probe_masks = None
+        if probe_radius > 0:
+            probe_masks = _probe_masks(config.hash_size, probe_radius, max_probes)
+        _, index_rows, lo, hi = stored_hashes.lookup_ranges(query_hashes[:config.num_tables], probe_masks)
+        matches, rows = count_range_hits(
+            index_rows, lo, hi, len(stored_hashes), max(min_matches, 1)
+        )
         
-        for table_idx, hash_value in enumerate(query_hashes):
-            if table_idx >= config.num_tables:
-                break
-                
-            # Find embeddings with matching hash in this table
-            key = (table_idx, hash_value)
-            matching_embeddings = stored_hashes.get(key, set())
-            
-            for embedding_id in matching_embeddings:
-                embedding_matches[embedding_id] = embedding_matches.get(embedding_id, 0) + 1
+        # Rank embeddings with sufficient matches by collision count
+        total_candidates = len(rows)
+        if max_results is not None and max_results < len(rows):
+            # Select the best max_results without sorting the crowded tail;
+            # the key orders by collisions, then row, like the stable sort
+            counts = matches[rows].astype(np.int64)
+            keys = (int(counts.max()) - counts) * len(matches) + rows
+            rows = rows[np.argpartition(keys, max_results)[:max_results]] if max_results > 0 else rows[:0]
+        ranked_rows = rows[np.argsort(-matches[rows], kind='stable')]
         
-        # Filter embeddings with sufficient matches
-        candidates = {
-            embedding_id for embedding_id, matches in embedding_matches.items()
-            if matches >= min_matches
-        }
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Found %d candidates from %d total matches (min_matches=%d), keeping %d",
+                         total_candidates, np.count_nonzero(matches), min_matches, len(ranked_rows))
         
-        logger.info(f"Found {len(candidates)} candidates from {len(embedding_matches)} "
-                   f"total matches (min_matches={min_matches})")
+        return ranked_rows
+    
+    def find_candidate_embeddings(self,
+                                client_id: str,
+                                query_hashes: List[int],
+                                stored_hashes: LSHIndex,
+                                min_matches: int = 1,
+                                max_results: Optional[int] = None) -> List[uuid.UUID]:
+        """
+        Find candidate embeddings using LSH hash matching
         
-        return candidates
+        Args:
+            client_id: Client identifier
+            query_hashes: LSH hashes of query vector
+            stored_hashes: Client's LSH index
+            min_matches: Minimum number of table matches required
+            max_results: Only return this many best candidates
+            
+        Returns:
+            Candidate embedding IDs, most table collisions first
+        """
+        ranked_rows = self.find_candidate_rows(
+            client_id, query_hashes, stored_hashes, min_matches, max_results=max_results
+        )
+        return [uuid.UUID(bytes=stored_hashes.embedding_ids[row]) for row in ranked_rows.tolist()]
     
     def estimate_similarity_from_hashes(self,
                                       hash1: List[int],
-                                      hash2: List[int]) -> float:
+                                      hash2: List[int],
+                                      hash_size: int) -> float:
         """
         Estimate cosine similarity from LSH hashes
         Based on the fraction of matching hash bits
@@ -217,6 +579,7 @@ class LSHSearchService:
         Args:
             hash1: LSH hashes of first vector
             hash2: LSH hashes of second vector
+            hash_size: Number of bits per hash (from the client's LSHConfig)
             
         Returns:
             Estimated cosine similarity (0 to 1)
@@ -224,23 +587,17 @@ class LSHSearchService:
         if len(hash1) != len(hash2):
             raise ValueError("Hash lists must have same length")
         
-        total_bits = 0
-        matching_bits = 0
-        
-        for h1, h2 in zip(hash1, hash2):
-            # Count matching bits between the two hashes
-            xor_result = h1 ^ h2
-            hash_size = max(h1.bit_length(), h2.bit_length(), 1)
-            
-            # Count number of 0 bits in XOR (matching bits)
-            matches = hash_size - bin(xor_result).count('1')
-            
-            matching_bits += matches
-            total_bits += hash_size
-        
+        total_bits = hash_size * len(hash1)
         if total_bits == 0:
             return 0.0
         
+        # Count matching bits over the low hash_size bits of each pair
+        matching_bits = count_matching_bits(
+            np.asarray(hash1, dtype=np.uint64),
+            np.asarray(hash2, dtype=np.uint64),
+            _hash_mask(hash_size)
+        )
+        
         # Convert bit match ratio to estimated cosine similarity
         bit_match_ratio = matching_bits / total_bits
         
@@ -250,6 +607,33 @@ class LSHSearchService:
         
         return estimated_similarity
     
+    def estimate_similarities_from_hashes(self,
+                                        query_hashes: List[int],
+                                        stored_hashes: np.ndarray,
+                                        hash_size: int) -> np.ndarray:
+        """
+        Batch variant of estimate_similarity_from_hashes
+        
+        Args:
+            query_hashes: LSH hashes of the query vector
+            stored_hashes: Array of shape (N, num_tables) of stored hashes
+            hash_size: Number of bits per hash (from the client's LSHConfig)
+            
+        Returns:
+            Estimated cosine similarities, shape (N,)
+        """
+        query = np.asarray(query_hashes, dtype=np.uint64)
+        stored = np.ascontiguousarray(stored_hashes, dtype=np.uint64)
+        if stored.ndim != 2 or stored.shape[1] != query.size:
+            raise ValueError("Stored hashes must have shape (N, len(query_hashes))")
+        
+        total_bits = hash_size * query.size
+        if total_bits == 0:
+            return np.zeros(len(stored), dtype=np.float64)
+        
+        matching_bits = count_matching_bits_batch(query, stored, _hash_mask(hash_size))
+        return np.clip(2 * (matching_bits / total_bits) - 0.5, 0.0, 1.0)
+    
     def get_client_config(self, client_id: str) -> Optional[LSHConfig]:
         """Get LSH configuration for a client"""
         return self.client_configs.get(client_id)
@@ -258,6 +642,7 @@ class LSHSearchService:
         """Clear all data for a client"""
         self.client_configs.pop(client_id, None)
         self.random_planes_cache.pop(client_id, None)
+        self.flat_planes_cache.pop(client_id, None)
         logger.info(f"Cleared LSH data for client {client_id}")
 
 
@@ -0,0 +1,91 @@
+"""
+Numba kernels for comparing LSH hashes and counting bucket collisions
+Compiled to native code so popcounts lower to the CPU's POPCNT instruction
+"""
+import numpy as np
+from numba import njit, prange, types
+from numba.extending import intrinsic
+
+
+@intrinsic
+def _popcount(typingctx, x):
+    """Emit llvm.ctpop for an integer argument"""
+    if not isinstance(x, types.Integer):
+        return None
+    
+    def codegen(context, builder, signature, args):
+        return builder.ctpop(args[0])
+    
+    return x(x), codegen
+
+
+@njit(cache=True)
+def count_matching_bits(hash1, hash2, mask):
+    """
+    Count matching bits between two uint64 hash arrays
+    
+    Only the bits selected by mask (the low hash_size bits) are compared.
+    """
+    matching_bits = 0
+    for i in range(hash1.size):
+        matching_bits += np.int64(_popcount(~(hash1[i] ^ hash2[i]) & mask))
+    return matching_bits
+
+
+@njit(parallel=True, cache=True)
+def count_matching_bits_batch(query_hashes, stored_hashes, mask):
+    """
+    Count matching bits between one query and each row of stored_hashes
+    
+    Args:
+        query_hashes: uint64 array of shape (num_tables,)
+        stored_hashes: uint64 array of shape (N, num_tables)
+        mask: uint64 mask selecting the low hash_size bits
+        
+    Returns:
+        Matching bit counts, int64 array of shape (N,)
+    """
+    n = stored_hashes.shape[0]
+    matching_bits = np.zeros(n, dtype=np.int64)
+    for row in prange(n):
+        matching_bits[row] = count_matching_bits(query_hashes, stored_hashes[row], mask)
+    return matching_bits
+
+
+@njit(cache=True)
+def count_range_hits(rows, lo, hi, num_rows, min_matches):
+    """
+    Union posting-list ranges and keep rows colliding often enough
+    
+    Args:
+        rows: uint32 row index of each sorted LSH key
+        lo: Start of each hit range in rows
+        hi: End (exclusive) of each hit range in rows
+        num_rows: Number of rows in the index
+        min_matches: Minimum number of hit ranges a row must appear in
+        
+    Returns:
+        Tuple of (per-row collision counts, int64 array of rows with at
+        least min_matches collisions, ascending)
+    """
+    counts = np.zeros(num_rows, dtype=np.int32)
+    end = 0  # one past the highest hit row; the threshold scan stops there
+    for i in range(lo.size):
+        for j in range(lo[i], hi[i]):
+            row = rows[j]
+            counts[row] += 1
+            if row >= end:
+                end = row + 1
+    
+    num_candidates = 0
+    for row in range(end):
+        if counts[row] >= min_matches:
+            num_candidates += 1
+    
+    candidates = np.empty(num_candidates, dtype=np.int64)
+    k = 0
+    for row in range(end):
+        if counts[row] >= min_matches:
+            candidates[k] = row
+            k += 1
+    return counts, candidates
@@ -2,16 +2,23 @@
 Secure Search Service
 Orchestrates homomorphic encryption and LSH for privacy-preserving similarity search
 """
+import os
 import uuid
 import time
-import base64
+import threading
+import pybase64
 import numpy as np
-from typing import List, Dict, Set, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Union
 from dataclasses import dataclass
 import logging
 
-from .homomorphic_encryption import he_service as global_he_service, HomomorphicEncryptionService
-from .lsh_search import lsh_service as global_lsh_service, LSHSearchService, LSHConfig
+from ..core.config import settings
+from .ciphertext_store import CiphertextStore
+from .homomorphic_encryption import (
+    he_service as global_he_service, HomomorphicEncryptionService,
+    SIMILARITY_DOT_PRODUCT, SIMILARITY_SLOT_PRODUCTS
+)
+from .lsh_search import lsh_service as global_lsh_service, LSHSearchService, LSHConfig, LSHIndex
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +29,15 @@ class SearchResult:
     embedding_id: uuid.UUID
     encrypted_similarity: str
     metadata: Optional[Dict[str, Any]] = None
+    pack_slot: Optional[int] = None  # Block index when encrypted_similarity holds packed products
+    similarity_encoding: str = SIMILARITY_DOT_PRODUCT  # SIMILARITY_SLOT_PRODUCTS for packed results
+
+
+@dataclass
+class PackedCiphertext:
+    """Group of stored embeddings sharing one packed ciphertext"""
+    embedding_ids: List[bytes]  # 16-byte embedding ID keys
+    ciphertext: Any = None  # Built lazily on first search; None when stale
 
 
 @dataclass
@@ -43,20 +59,70 @@ class SecureSearchService:
     
     def __init__(self, 
                  he_service: HomomorphicEncryptionService = None,
-                 lsh_service: LSHSearchService = None):
+                 lsh_service: LSHSearchService = None,
+                 ciphertext_store_dir: Optional[str] = None):
         self.he_service = he_service or global_he_service
         self.lsh_service = lsh_service or global_lsh_service
         
-        # Client data storage
+        # When set, each client's ciphertexts live in an mmap-backed file here
+        self.ciphertext_store_dir = ciphertext_store_dir
+        
+        # Client data storage; embeddings are keyed internally by the 16-byte
+        # embedding_id.bytes and only become UUIDs again in search results
         self.client_contexts: Dict[str, Any] = {}
-        self.client_embeddings: Dict[str, List[Tuple[uuid.UUID, str]]] = {}  # client_id -> [(embedding_id, encrypted_vector)]
-        self.client_lsh_hashes: Dict[str, Dict[Tuple[int, int], Set[uuid.UUID]]] = {}  # client_id -> {(table, hash): {embedding_ids}}
+        self.client_embeddings: Dict[str, Union[Dict[bytes, bytes], CiphertextStore]] = {}  # client_id -> {embedding_id.bytes: serialized encrypted_vector}
+        self.client_lsh_hashes: Dict[str, LSHIndex] = {}  # client_id -> per-table sorted hash arrays
+        
+        # Packed ciphertext layout: client_id -> packs, and embedding_id -> (pack, slot)
+        self.client_packs: Dict[str, List[PackedCiphertext]] = {}
+        self.client_pack_slots: Dict[str, Dict[bytes, Tuple[int, int]]] = {}
+        self.client_pack_capacity: Dict[str, int] = {}
+        
+        # Writers hold a client's lock; searches only take it to snapshot
+        # references, then work on the append-only structures unlocked
+        self.client_locks: Dict[str, threading.RLock] = {}
+    
+    def _new_ciphertext_store(self, client_id: str) -> Union[Dict[bytes, bytes], CiphertextStore]:
+        """Empty ciphertext store for a client: a dict, or a file when configured"""
+        if self.ciphertext_store_dir is None:
+            return {}
+        # A fresh file per generation, so searches still reading the
+        # previous store are never truncated underneath
+        path = os.path.join(self.ciphertext_store_dir, f"{client_id}.{uuid.uuid4().hex[:8]}.ctxt")
+        return CiphertextStore(path)
+    
+    def _replace_ciphertext_store(self,
+                                  client_id: str,
+                                  store: Union[Dict[bytes, bytes], CiphertextStore, None]):
+        """
+        Swap in a client's ciphertext store, discarding any previous file
+        
+        A replaced store is only unlinked, so searches still reading it
+        finish; a removed one (store=None) is closed as well.
+        """
+        if store is None:
+            previous = self.client_embeddings.pop(client_id, None)
+        else:
+            previous = self.client_embeddings.get(client_id)
+            self.client_embeddings[client_id] = store
+        if isinstance(previous, CiphertextStore):
+            if store is None:
+                previous.close()
+            previous.discard()
+    
+    def _client_lock(self, client_id: str) -> threading.RLock:
+        """Get the lock guarding a client's in-memory data"""
+        lock = self.client_locks.get(client_id)
+        if lock is None:
+            lock = self.client_locks.setdefault(client_id, threading.RLock())
+        return lock
         
     def initialize_client(self,
                          client_id: str,
                          context_params: Dict[str, Any],
                          embedding_dim: int = 384,
-                         lsh_config: Dict[str, int] = None) -> Dict[str, Any]:
+                         lsh_config: Dict[str, int] = None,
+                         include_random_planes: bool = False) -> Dict[str, Any]:
         """
         Initialize a new client with HE context and LSH configuration
         
@@ -65,11 +131,12 @@ class SecureSearchService:
             context_params: HE context parameters
             embedding_dim: Dimension of embedding vectors
             lsh_config: LSH configuration parameters
+            include_random_planes: Also serialize the planes for legacy clients
             
         Returns:
-            Initialization response with random planes for LSH
+            Initialization response with the seed reproducing the LSH planes
         """
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
         # Set default LSH config
         if lsh_config is None:
@@ -80,11 +147,16 @@ class SecureSearchService:
             }
         
         try:
-            # Create HE context
-            he_context = self.he_service.create_context(
-                poly_modulus_degree=context_params.get("poly_modulus_degree", 8192),
-                scale=context_params.get("scale", 2**40)
-            )
+            # Use the client's own serialized public context when it sends
+            # one; otherwise generate a context with fresh keys for this client
+            if context_params.get("public_context"):
+                he_context = self.he_service.deserialize_context(context_params["public_context"])
+            else:
+                he_context = self.he_service.create_context(
+                    poly_modulus_degree=context_params.get("poly_modulus_degree", 8192),
+                    scale=context_params.get("scale", 2**40),
+                    symmetric=context_params.get("symmetric_encryption", False)
+                )
             
             # Cache the context
             self.he_service.cache_context(client_id, he_context)
@@ -102,13 +174,19 @@ class SecureSearchService:
             self.lsh_service.cache_random_planes(client_id, random_planes)
             
             # Initialize client data structures
-            self.client_embeddings[client_id] = []
-            self.client_lsh_hashes[client_id] = {}
+            with self._client_lock(client_id):
+                self._replace_ciphertext_store(client_id, self._new_ciphertext_store(client_id))
+                self.client_lsh_hashes[client_id] = LSHIndex(lsh_config_obj.num_tables, lsh_config_obj.hash_size)
+                self._reset_packs(
+                    client_id, self.he_service.get_packing_capacity(he_context, embedding_dim)
+                )
             
-            # Serialize random planes for client
-            random_planes_b64 = self.lsh_service.serialize_random_planes(random_planes)
+            # Clients regenerate the planes from the seed; serialize only on request
+            random_planes_b64 = None
+            if include_random_planes:
+                random_planes_b64 = self.lsh_service.serialize_random_planes(random_planes)
             
-            init_time = (time.time() - start_time) * 1000
+            init_time = (time.perf_counter_ns() - start_time) / 1e6
             logger.info(f"Initialized client {client_id} in {init_time:.2f}ms")
             
             return {
@@ -121,6 +199,7 @@ class SecureSearchService:
                     "hash_size": lsh_config_obj.hash_size,
                     "embedding_dim": lsh_config_obj.embedding_dim
                 },
+                "random_seed": lsh_config_obj.random_seed,
                 "random_planes": random_planes_b64,
                 "initialization_time_ms": init_time
             }
@@ -132,7 +211,7 @@ class SecureSearchService:
     def add_embedding(self,
                      client_id: str,
                      embedding_id: uuid.UUID,
-                     encrypted_vector: str,
+                     encrypted_vector: Union[str, bytes],
                      lsh_hashes: List[int],
                      metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -141,58 +220,79 @@ class SecureSearchService:
         Args:
             client_id: Client identifier
             embedding_id: Unique embedding identifier
-            encrypted_vector: Base64 encoded encrypted vector
+            encrypted_vector: Base64 encoded or raw serialized encrypted vector
             lsh_hashes: LSH hash values for the vector
             metadata: Optional metadata for the embedding
             
         Returns:
             Add embedding response
         """
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
         try:
-            # Validate client exists
-            if client_id not in self.client_embeddings:
-                raise ValueError(f"Client {client_id} not initialized")
+            # Store encrypted embedding as raw bytes; base64 stays at the API boundary
+            if isinstance(encrypted_vector, str):
+                encrypted_vector = pybase64.b64decode(encrypted_vector, validate=False)
             
-            # Store encrypted embedding
-            self.client_embeddings[client_id].append((embedding_id, encrypted_vector))
+            embedding_key = embedding_id.bytes
             
-            # Store LSH hashes
-            client_lsh_data = self.client_lsh_hashes[client_id]
-            
-            logger.info(f"Adding embedding {embedding_id} with LSH hashes: {lsh_hashes}")
-            
-            for table_idx, hash_value in enumerate(lsh_hashes):
-                key = (table_idx, hash_value)
-                if key not in client_lsh_data:
-                    client_lsh_data[key] = set()
-                client_lsh_data[key].add(embedding_id)
-            
-            logger.info(f"Total LSH buckets after add: {len(client_lsh_data)}")
+            with self._client_lock(client_id):
+                # Validate client exists
+                if client_id not in self.client_embeddings:
+                    raise ValueError(f"Client {client_id} not initialized")
+                
+                client_embeddings = self.client_embeddings[client_id]
+                if embedding_key in client_embeddings:
+                    # Replaced in place; drop the stale deserialized copy
+                    self.he_service.evict_ciphertext(embedding_key)
+                client_embeddings[embedding_key] = encrypted_vector
+                self._assign_to_pack(client_id, embedding_key)
+                
+                # Store LSH hashes
+                client_lsh_data = self.client_lsh_hashes[client_id]
+                
+                logger.debug("Adding embedding %s with LSH hashes: %s", embedding_id, lsh_hashes)
+                
+                client_lsh_data.add(embedding_key, lsh_hashes)
+                
+                logger.debug("Total LSH-indexed embeddings after add: %d", len(client_lsh_data))
             
-            add_time = (time.time() - start_time) * 1000
+            add_time = (time.perf_counter_ns() - start_time) / 1e6
             
-            logger.info(f"Added embedding {embedding_id} for client {client_id} "
-                       f"in {add_time:.2f}ms")
+            logger.info("Added embedding %s for client %s in %.2fms",
+                       embedding_id, client_id, add_time)
             
             return {
                 "embedding_id": embedding_id,
                 "status": "success",
                 "add_time_ms": add_time,
-                "total_embeddings": len(self.client_embeddings[client_id])
+                "total_embeddings": len(client_embeddings)
             }
             
         except Exception as e:
             logger.error(f"Failed to add embedding for client {client_id}: {e}")
             raise
     
+    def check_embedding(self, client_id: str, lsh_hashes: List[int]):
+        """
+        Raise ValueError if add_embedding would reject this embedding
+        
+        Lets callers validate before persisting, then apply add_embedding
+        only once their database commit has succeeded.
+        """
+        if client_id not in self.client_embeddings:
+            raise ValueError(f"Client {client_id} not initialized")
+        if lsh_hashes and (min(lsh_hashes) < 0 or max(lsh_hashes) >= 1 << 64):
+            raise ValueError("LSH hashes must fit in uint64")
+    
     def search_embeddings(self,
                          client_id: str,
                          encrypted_query: str,
                          lsh_hashes: List[int],
                          top_k: int = 10,
-                         rerank_candidates: int = 100) -> Tuple[List[SearchResult], SearchStats]:
+                         rerank_candidates: int = 100,
+                         packed: bool = False,
+                         probe_radius: int = 2) -> Tuple[List[SearchResult], SearchStats]:
         """
         Perform secure similarity search
         
@@ -202,22 +302,66 @@ class SecureSearchService:
             lsh_hashes: LSH hashes of query vector
             top_k: Number of results to return
             rerank_candidates: Maximum candidates to check with HE
+            packed: Compute one batched similarity per packed ciphertext.
+                   Results scored this way have similarity_encoding
+                   SIMILARITY_SLOT_PRODUCTS: encrypted_similarity holds the
+                   slot-wise products of the whole pack and pack_slot gives
+                   the block the client sums after decryption. Candidates
+                   outside any pack are scored with the regular dot
+                   product and keep SIMILARITY_DOT_PRODUCT.
+            probe_radius: Multi-probe LSH radius; buckets up to this many
+                         flipped hash bits away also yield candidates
             
         Returns:
             Tuple of (search results, search statistics)
         """
-        start_time = time.time()
+        embedding_keys, similarities, pack_slots, stats = self._search(
+            client_id, encrypted_query, lsh_hashes, top_k, rerank_candidates, packed, probe_radius
+        )
+        
+        results = [
+            SearchResult(
+                embedding_id=uuid.UUID(bytes=embedding_key),
+                encrypted_similarity=pybase64.b64encode_as_string(similarity_bytes),
+                metadata=None,  # Would be retrieved from database in full implementation
+                pack_slot=pack_slot,
+                similarity_encoding=SIMILARITY_DOT_PRODUCT if pack_slot is None else SIMILARITY_SLOT_PRODUCTS
+            )
+            for embedding_key, similarity_bytes, pack_slot in zip(embedding_keys, similarities, pack_slots)
+        ]
+        return results, stats
+    
+    def _search(self,
+                client_id: str,
+                encrypted_query: str,
+                lsh_hashes: List[int],
+                top_k: int,
+                rerank_candidates: int,
+                packed: bool,
+                probe_radius: int) -> Tuple[List[bytes], List[bytes], List[Optional[int]], SearchStats]:
+        """
+        Run LSH candidate selection and the HE similarity stage
+        
+        Returns:
+            Tuple of (16-byte embedding ID keys, serialized encrypted
+            similarities, pack slots (None when unpacked), search
+            statistics), parallel lists
+        """
+        start_time = time.perf_counter_ns()
         
         try:
-            # Validate client exists
-            if client_id not in self.client_embeddings:
-                raise ValueError(f"Client {client_id} not initialized")
-            
-            client_embeddings = self.client_embeddings[client_id]
-            total_embeddings = len(client_embeddings)
+            # Snapshot the client's structures; adds only append to them
+            with self._client_lock(client_id):
+                # Validate client exists
+                if client_id not in self.client_embeddings:
+                    raise ValueError(f"Client {client_id} not initialized")
+                
+                client_embeddings = self.client_embeddings[client_id]
+                stored_hashes = self.client_lsh_hashes[client_id]
+                total_embeddings = len(client_embeddings)
             
             if total_embeddings == 0:
-                return [], SearchStats(
+                return [], [], [], SearchStats(
                     total_embeddings=0,
                     candidates_found=0,
                     candidates_checked=0,
@@ -227,93 +371,198 @@ class SecureSearchService:
                 )
             
             # Step 1: LSH candidate selection
-            lsh_start = time.time()
+            lsh_start = time.perf_counter_ns()
             
             # Debug logging
-            stored_hashes = self.client_lsh_hashes[client_id]
-            logger.info(f"Search debug for client {client_id}:")
-            logger.info(f"  Query hashes: {lsh_hashes}")
-            logger.info(f"  Stored hash buckets: {len(stored_hashes)}")
-            logger.info(f"  Total embeddings: {total_embeddings}")
+            logger.debug("Search debug for client %s:", client_id)
+            logger.debug("  Query hashes: %s", lsh_hashes)
+            logger.debug("  Indexed embeddings: %d", len(stored_hashes))
+            logger.debug("  Total embeddings: %d", total_embeddings)
             
-            candidates = self.lsh_service.find_candidate_embeddings(
+            candidate_rows = self.lsh_service.find_candidate_rows(
                 client_id=client_id,
                 query_hashes=lsh_hashes,
                 stored_hashes=stored_hashes,
-                min_matches=1  # At least 1 table match required
+                min_matches=1,  # At least 1 table match required
+                probe_radius=probe_radius,
+                max_results=rerank_candidates
             )
             
-            lsh_time = (time.time() - lsh_start) * 1000
+            # Only the most-colliding candidates kept for HE computation are
+            # resolved back to embedding IDs
+            candidate_list = [stored_hashes.embedding_ids[row] for row in candidate_rows.tolist()]
             
-            # Limit candidates for HE computation
-            candidate_list = list(candidates)[:rerank_candidates]
+            lsh_time = (time.perf_counter_ns() - lsh_start) / 1e6
             
             # Step 2: Homomorphic encryption similarity computation
-            he_start = time.time()
-            
-            results = []
-            he_context = self.he_service.get_cached_context(client_id)
+            he_start = time.perf_counter_ns()
             
-            if he_context is None:
-                raise ValueError(f"No cached HE context for client {client_id}")
+            embedding_keys: List[bytes] = []
+            similarities: List[bytes] = []
+            pack_slots: List[Optional[int]] = []
             
-            for embedding_id in candidate_list:
-                # Find the encrypted vector for this embedding
-                encrypted_vector = None
-                for stored_id, stored_vector in client_embeddings:
-                    if stored_id == embedding_id:
-                        encrypted_vector = stored_vector
-                        break
+            # No candidates: skip the HE context and query deserialization
+            if candidate_list:
+                he_context = self.he_service.get_cached_context(client_id)
                 
-                if encrypted_vector is None:
-                    continue
+                if he_context is None:
+                    raise ValueError(f"No cached HE context for client {client_id}")
                 
-                # Compute encrypted similarity
-                try:
-                    encrypted_similarity = self.he_service.compute_encrypted_similarity(
-                        context=he_context,
-                        encrypted_query=encrypted_query,
-                        encrypted_vector=encrypted_vector
-                    )
+                if packed and client_id in self.client_packs:
+                    for embedding_key, similarity_bytes, slot in self._search_packed(
+                        client_id, he_context, encrypted_query, candidate_list
+                    ):
+                        embedding_keys.append(embedding_key)
+                        similarities.append(similarity_bytes)
+                        pack_slots.append(slot)
+                else:
+                    query_vec = self.he_service.deserialize_encrypted_vector(he_context, encrypted_query)
                     
-                    results.append(SearchResult(
-                        embedding_id=embedding_id,
-                        encrypted_similarity=encrypted_similarity,
-                        metadata=None  # Would be retrieved from database in full implementation
-                    ))
-                    
-                except Exception as e:
-                    logger.warning(f"Failed to compute similarity for {embedding_id}: {e}")
-                    continue
+                    # One native-op loop per worker over the candidates' stored
+                    # vectors, deserialized once and reused through the HE
+                    # service's ciphertext LRU; results keep candidate order
+                    candidate_similarities = self.he_service.compute_similarities_bytes(
+                        he_context,
+                        query_vec,
+                        [client_embeddings.get(embedding_key) for embedding_key in candidate_list],
+                        embedding_ids=candidate_list
+                    )
+                    for embedding_key, similarity_bytes in zip(candidate_list, candidate_similarities):
+                        if similarity_bytes is not None:
+                            embedding_keys.append(embedding_key)
+                            similarities.append(similarity_bytes)
+                            pack_slots.append(None)
             
-            he_time = (time.time() - he_start) * 1000
+            he_time = (time.perf_counter_ns() - he_start) / 1e6
             
             # Limit results to top_k
             # Note: Server cannot sort by similarity since scores are encrypted
             # Client will decrypt and sort on their side
-            results = results[:top_k * 2]  # Return extra for client to sort
+            num_results = top_k * 2  # Return extra for client to sort
+            embedding_keys = embedding_keys[:num_results]
+            similarities = similarities[:num_results]
+            pack_slots = pack_slots[:num_results]
             
-            total_time = (time.time() - start_time) * 1000
+            total_time = (time.perf_counter_ns() - start_time) / 1e6
             
             stats = SearchStats(
                 total_embeddings=total_embeddings,
-                candidates_found=len(candidates),
+                candidates_found=len(candidate_rows),
                 candidates_checked=len(candidate_list),
                 search_time_ms=total_time,
                 lsh_time_ms=lsh_time,
                 he_time_ms=he_time
             )
             
-            logger.info(f"Search completed for client {client_id}: "
-                       f"{len(results)} results from {len(candidates)} candidates "
-                       f"in {total_time:.2f}ms")
+            logger.info("Search completed for client %s: %d results from %d candidates in %.2fms",
+                       client_id, len(embedding_keys), len(candidate_rows), total_time)
             
-            return results, stats
+            return embedding_keys, similarities, pack_slots, stats
             
         except Exception as e:
             logger.error(f"Search failed for client {client_id}: {e}")
             raise
     
+    def _search_packed(self,
+                       client_id: str,
+                       he_context: Any,
+                       encrypted_query: str,
+                       candidate_list: List[bytes]) -> List[Tuple[bytes, bytes, Optional[int]]]:
+        """
+        Compute candidate similarities with one HE op per containing pack
+        
+        Candidates not assigned to a pack are scored with the regular dot
+        product instead.
+        
+        Returns:
+            (embedding ID key, serialized slot-wise products of its pack,
+            slot) per packed candidate and (embedding ID key, serialized
+            dot product, None) per unpacked one, in candidate order
+        """
+        with self._client_lock(client_id):
+            client_embeddings = self.client_embeddings[client_id]
+            packs = self.client_packs[client_id]
+            pack_slots = self.client_pack_slots[client_id]
+        query_vec = self.he_service.deserialize_encrypted_vector(he_context, encrypted_query)
+        
+        unpacked = [embedding_key for embedding_key in candidate_list if embedding_key not in pack_slots]
+        dot_results: Dict[bytes, bytes] = {}
+        if unpacked:
+            unpacked_similarities = self.he_service.compute_similarities_bytes(
+                he_context,
+                query_vec,
+                [client_embeddings.get(embedding_key) for embedding_key in unpacked],
+                embedding_ids=unpacked
+            )
+            dot_results = {
+                embedding_key: similarity_bytes
+                for embedding_key, similarity_bytes in zip(unpacked, unpacked_similarities)
+                if similarity_bytes is not None
+            }
+        
+        results = []
+        pack_results: Dict[int, bytes] = {}
+        
+        for embedding_key in candidate_list:
+            location = pack_slots.get(embedding_key)
+            if location is None:
+                if embedding_key in dot_results:
+                    results.append((embedding_key, dot_results[embedding_key], None))
+                continue
+            pack_idx, slot = location
+            
+            try:
+                if pack_idx not in pack_results:
+                    pack = packs[pack_idx]
+                    # Rebuild stale packs under the lock so members and
+                    # ciphertext stay in step with concurrent adds
+                    with self._client_lock(client_id):
+                        if pack.ciphertext is None:
+                            pack.ciphertext = self.he_service.pack_encrypted_vectors(
+                                he_context,
+                                [client_embeddings[member] for member in pack.embedding_ids]
+                            )
+                        ciphertext, count = pack.ciphertext, len(pack.embedding_ids)
+                    pack_results[pack_idx] = self.he_service.compute_batched_similarity_bytes(
+                        he_context, query_vec, ciphertext, count
+                    )
+                
+                results.append((embedding_key, pack_results[pack_idx], slot))
+                
+            except Exception as e:
+                logger.warning("Failed to compute packed similarity for %s: %s",
+                               uuid.UUID(bytes=embedding_key), e)
+                continue
+        
+        return results
+    
+    def _reset_packs(self, client_id: str, capacity: int):
+        """Start an empty pack layout for a client"""
+        self.client_packs[client_id] = []
+        self.client_pack_slots[client_id] = {}
+        self.client_pack_capacity[client_id] = max(capacity, 1)
+    
+    def _assign_to_pack(self, client_id: str, embedding_key: bytes):
+        """Place an embedding in the open pack and mark that pack for rebuild"""
+        packs = self.client_packs.get(client_id)
+        if packs is None:
+            return
+        
+        pack_slots = self.client_pack_slots[client_id]
+        location = pack_slots.get(embedding_key)
+        if location is not None:
+            # Ciphertext replaced in place
+            packs[location[0]].ciphertext = None
+            return
+        
+        if not packs or len(packs[-1].embedding_ids) >= self.client_pack_capacity[client_id]:
+            packs.append(PackedCiphertext(embedding_ids=[]))
+        
+        pack = packs[-1]
+        pack_slots[embedding_key] = (len(packs) - 1, len(pack.embedding_ids))
+        pack.embedding_ids.append(embedding_key)
+        pack.ciphertext = None
+    
     def get_client_stats(self, client_id: str) -> Dict[str, Any]:
         """Get statistics for a client"""
         if client_id not in self.client_embeddings:
@@ -322,7 +571,7 @@ class SecureSearchService:
         return {
             "client_id": client_id,
             "total_embeddings": len(self.client_embeddings[client_id]),
-            "lsh_buckets": len(self.client_lsh_hashes[client_id]),
+            "lsh_buckets": self.client_lsh_hashes[client_id].bucket_count(),
             "has_he_context": self.he_service.get_cached_context(client_id) is not None,
             "has_lsh_config": client_id in self.lsh_service.client_configs
         }
@@ -337,51 +586,70 @@ class SecureSearchService:
         # Convert string to UUID for database query
         client_uuid = uuid_module.UUID(client_id)
         
-        # Initialize client data structures if not exists
-        if client_id not in self.client_embeddings:
-            self.client_embeddings[client_id] = []
-        if client_id not in self.client_lsh_hashes:
-            self.client_lsh_hashes[client_id] = {}
-        
         # Load embeddings
         embeddings = db_session.query(Embedding).filter(
             Embedding.client_id == client_uuid,
             Embedding.is_deleted == False
         ).all()
         
-        # Clear existing in-memory data
-        self.client_embeddings[client_id] = []
-        self.client_lsh_hashes[client_id] = {}
-        
-        # Load embeddings into memory
-        for embedding in embeddings:
-            # Convert encrypted vector back to base64 string
-            encrypted_vector_b64 = base64.b64encode(embedding.encrypted_vector).decode()
-            self.client_embeddings[client_id].append((embedding.embedding_id, encrypted_vector_b64))
-        
         # Load LSH hashes
         lsh_hashes = db_session.query(LSHHash).filter(
             LSHHash.client_id == client_uuid
         ).all()
         
-        client_lsh_data = self.client_lsh_hashes[client_id]
+        lsh_config = self.lsh_service.get_client_config(client_id)
+        if lsh_config is not None:
+            num_tables = lsh_config.num_tables
+            hash_size = lsh_config.hash_size
+        else:
+            num_tables = max((lsh_hash.table_index for lsh_hash in lsh_hashes), default=-1) + 1
+            hash_size = max((lsh_hash.hash_value.bit_length() for lsh_hash in lsh_hashes), default=1) or 1
+        
+        client_lsh_data = LSHIndex(num_tables, hash_size)
         for lsh_hash in lsh_hashes:
-            key = (lsh_hash.table_index, lsh_hash.hash_value)
-            if key not in client_lsh_data:
-                client_lsh_data[key] = set()
-            client_lsh_data[key].add(lsh_hash.embedding_id)
+            client_lsh_data.add_hash(lsh_hash.embedding_id.bytes, lsh_hash.table_index, lsh_hash.hash_value)
+        
+        # Keep the stored bytes as-is
+        client_embeddings = self._new_ciphertext_store(client_id)
+        for embedding in embeddings:
+            client_embeddings[embedding.embedding_id.bytes] = embedding.encrypted_vector
+        
+        # Swap in the rebuilt data so searches never see a partial load
+        with self._client_lock(client_id):
+            for embedding in embeddings:
+                self.he_service.evict_ciphertext(embedding.embedding_id.bytes)
+            self._replace_ciphertext_store(client_id, client_embeddings)
+            self.client_lsh_hashes[client_id] = client_lsh_data
+            
+            # Rebuild the pack layout when the client's capacity is known
+            capacity = self.client_pack_capacity.get(client_id)
+            if capacity is not None:
+                self._reset_packs(client_id, capacity)
+                for embedding in embeddings:
+                    self._assign_to_pack(client_id, embedding.embedding_id.bytes)
         
         logger.info(f"Loaded {len(embeddings)} embeddings and {len(lsh_hashes)} LSH hashes for client {client_id}")
         return len(embeddings), len(lsh_hashes)
     
     def clear_client_data(self, client_id: str):
         """Clear all data for a client"""
-        self.client_embeddings.pop(client_id, None)
-        self.client_lsh_hashes.pop(client_id, None)
+        with self._client_lock(client_id):
+            self._replace_ciphertext_store(client_id, None)
+            self.client_lsh_hashes.pop(client_id, None)
+            self.client_packs.pop(client_id, None)
+            self.client_pack_slots.pop(client_id, None)
+            self.client_pack_capacity.pop(client_id, None)
+        self.client_locks.pop(client_id, None)
         self.he_service.clear_context_cache(client_id)
         self.lsh_service.clear_client_data(client_id)
         logger.info(f"Cleared all data for client {client_id}")
+    
+    def shutdown(self):
+        """Close and delete every client's ciphertext store file"""
+        for client_id in list(self.client_embeddings):
+            with self._client_lock(client_id):
+                self._replace_ciphertext_store(client_id, None)
 
 
 # Global service instance
-secure_search_service = SecureSearchService()
\ No newline at end of file
+secure_search_service = SecureSearchService(ciphertext_store_dir=settings.CIPHERTEXT_STORE_DIR)
\ No newline at end of file
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Ensure the db-server package (src) is importable when running from db-server dir
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from src.services.ciphertext_store import CiphertextStore
+
+
+def _key(i: int) -> bytes:
+    return i.to_bytes(16, "little")
+
+
+def test_append_and_get(tmp_path):
+    with CiphertextStore(str(tmp_path / "a.ctxt")) as store:
+        values = {_key(i): bytes([i]) * (i + 1) for i in range(50)}
+        for key, value in values.items():
+            store[key] = value
+
+        assert len(store) == len(values)
+        for key, value in values.items():
+            assert key in store
+            assert store.get(key) == value
+            assert store[key] == value
+
+
+def test_missing_and_empty_values(tmp_path):
+    with CiphertextStore(str(tmp_path / "a.ctxt")) as store:
+        assert store.get(_key(1)) is None
+        assert store.get(_key(1), b"x") == b"x"
+        with pytest.raises(KeyError):
+            store[_key(1)]
+
+        store[_key(2)] = b""
+        assert store.get(_key(2)) == b""
+
+
+def test_replace_keeps_row_and_returns_latest(tmp_path):
+    with CiphertextStore(str(tmp_path / "a.ctxt")) as store:
+        store[_key(1)] = b"old"
+        store[_key(2)] = b"other"
+        store[_key(1)] = b"newer value"
+
+        assert len(store) == 2
+        assert list(store) == [_key(1), _key(2)]
+        assert store[_key(1)] == b"newer value"
+        assert store[_key(2)] == b"other"
+
+
+def test_reads_remap_after_growth(tmp_path):
+    # Force a read (and so a mapping) before more data is appended, past
+    # the initial offset capacity
+    with CiphertextStore(str(tmp_path / "a.ctxt")) as store:
+        store[_key(0)] = b"first"
+        assert store[_key(0)] == b"first"
+
+        count = CiphertextStore._INITIAL_CAPACITY + 10
+        for i in range(1, count):
+            store[_key(i)] = i.to_bytes(4, "little") * 8
+
+        assert store[_key(0)] == b"first"
+        assert store[_key(count - 1)] == (count - 1).to_bytes(4, "little") * 8
+
+
+def test_close_releases_file_and_mapping(tmp_path):
+    store = CiphertextStore(str(tmp_path / "a.ctxt"))
+    store[_key(1)] = b"value"
+    assert store[_key(1)] == b"value"
+
+    store.close()
+    store.close()  # idempotent
+    assert store._file.closed
+    assert store._map is None
+    with pytest.raises(ValueError):
+        store[_key(2)] = b"more"
+
+
+def test_context_manager_closes(tmp_path):
+    with CiphertextStore(str(tmp_path / "a.ctxt")) as store:
+        store[_key(1)] = b"value"
+    assert store._file.closed
+
+
+def test_reopen_starts_empty(tmp_path):
+    path = str(tmp_path / "a.ctxt")
+    with CiphertextStore(path) as store:
+        store[_key(1)] = b"value"
+    assert os.path.getsize(path) == len(b"value")
+
+    # Offsets are not persisted, so a store opened on an existing path starts over
+    with CiphertextStore(path) as store:
+        assert len(store) == 0
+        assert store.get(_key(1)) is None
+        store[_key(2)] = b"fresh"
+        assert store[_key(2)] == b"fresh"
+
+
+def test_discard_removes_file(tmp_path):
+    path = str(tmp_path / "sub" / "a.ctxt")
+    store = CiphertextStore(path)
+    store[_key(1)] = b"value"
+    store.close()
+    store.discard()
+    store.discard()  # already gone
+    assert not os.path.exists(path)
+
+
+def test_service_closes_stores_on_client_removal_and_shutdown(tmp_path):
+    from src.services.secure_search_service import SecureSearchService
+
+    service = SecureSearchService(ciphertext_store_dir=str(tmp_path))
+    lsh_config = {"num_tables": 2, "hash_size": 4}
+    service.initialize_client("removed", {}, 8, lsh_config)
+    service.initialize_client("kept", {}, 8, lsh_config)
+    removed = service.client_embeddings["removed"]
+    kept = service.client_embeddings["kept"]
+
+    service.clear_client_data("removed")
+    assert removed._file.closed
+    assert not os.path.exists(removed.path)
+    assert not kept._file.closed
+
+    service.shutdown()
+    assert kept._file.closed
+    assert not os.path.exists(kept.path)
+    assert service.client_embeddings == {}
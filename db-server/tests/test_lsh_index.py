@@ -0,0 +1,200 @@
+import uuid
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from src.services.lsh_search import LSHIndex, multi_probe, _probe_masks
+from src.services.lsh_utils import count_range_hits
+
+
+def _ids(count: int):
+    return [uuid.UUID(int=i + 1).bytes for i in range(count)]
+
+
+def _naive_lookup(entries, query_hashes, hash_size, radius=0):
+    """Rows colliding with the query, one per (row, table) collision"""
+    hits = []
+    for row, hashes in enumerate(entries):
+        for table_idx, (stored, query) in enumerate(zip(hashes, query_hashes)):
+            if bin(stored ^ query).count("1") <= radius:
+                hits.append(row)
+    return Counter(hits)
+
+
+def test_empty_index():
+    index = LSHIndex(num_tables=4, hash_size=8)
+
+    keys, rows, lo, hi = index.lookup_ranges([1, 2, 3, 4])
+    assert len(keys) == len(rows) == len(lo) == len(hi) == 0
+    assert len(index.lookup([1, 2, 3, 4])) == 0
+    assert len(index) == 0
+    assert index.bucket_count() == 0
+    assert list(index.iter_buckets()) == []
+
+
+def test_single_row():
+    index = LSHIndex(num_tables=3, hash_size=8)
+    (embedding_id,) = _ids(1)
+    index.add(embedding_id, [5, 6, 7])
+
+    assert index.lookup([5, 6, 7]).tolist() == [0, 0, 0]
+    assert index.lookup([5, 0, 0]).tolist() == [0]
+    assert len(index.lookup([0, 0, 0])) == 0
+    # Same hash under another table is a different bucket
+    assert len(index.lookup([6, 7, 5])) == 0
+    assert index.bucket_count() == 3
+    assert list(index.iter_buckets()) == [
+        (table_idx, hash_value, [uuid.UUID(bytes=embedding_id)])
+        for table_idx, hash_value in enumerate([5, 6, 7])
+    ]
+
+
+@pytest.mark.parametrize("hash_size", [4, 16, 60])
+def test_lookup_matches_naive_across_flushes(hash_size):
+    rng = np.random.default_rng(hash_size)
+    num_tables = 4
+    hash_limit = 1 << min(hash_size, 6)  # small range so buckets collide
+    entries = rng.integers(0, hash_limit, size=(300, num_tables)).tolist()
+    index = LSHIndex(num_tables=num_tables, hash_size=hash_size)
+
+    # Interleave adds and lookups so both pending and flushed keys are hit,
+    # including growth of the pending buffers past their initial capacity
+    for start, end in [(0, 10), (10, 200), (200, 300)]:
+        for row in range(start, end):
+            index.add(_ids(300)[row], entries[row])
+        for query in rng.integers(0, hash_limit, size=(5, num_tables)).tolist():
+            assert Counter(index.lookup(query).tolist()) == _naive_lookup(entries[:end], query, hash_size)
+
+
+def test_add_hash_matches_add():
+    entries = [[1, 2], [1, 3], [4, 2]]
+    by_row = LSHIndex(num_tables=2, hash_size=8)
+    by_hash = LSHIndex(num_tables=2, hash_size=8)
+    for embedding_id, hashes in zip(_ids(3), entries):
+        by_row.add(embedding_id, hashes)
+        for table_idx, hash_value in enumerate(hashes):
+            by_hash.add_hash(embedding_id, table_idx, hash_value)
+    by_hash.add_hash(_ids(1)[0], 5, 1)  # table out of range is ignored
+
+    for query in [[1, 2], [4, 3], [0, 0]]:
+        assert sorted(by_row.lookup(query).tolist()) == sorted(by_hash.lookup(query).tolist())
+    assert by_row.bucket_count() == by_hash.bucket_count() == 4
+
+
+def test_hashes_wider_than_hash_size_are_masked():
+    index = LSHIndex(num_tables=2, hash_size=4)
+    index.add(_ids(1)[0], [0x13, 0x2])
+
+    assert index.lookup([0x3, 0x12]).tolist() == [0, 0]
+
+
+def test_lookup_ranges_snapshot_survives_later_adds():
+    index = LSHIndex(num_tables=2, hash_size=8)
+    ids = _ids(50)
+    for embedding_id in ids[:10]:
+        index.add(embedding_id, [1, 1])
+
+    keys, rows, lo, hi = index.lookup_ranges([1, 1])
+    for embedding_id in ids[10:]:
+        index.add(embedding_id, [0, 0])
+    index.bucket_count()  # flushes and replaces index.rows
+
+    hits = np.concatenate([rows[start:end] for start, end in zip(lo, hi)])
+    assert sorted(hits.tolist()) == sorted(list(range(10)) * 2)
+    assert np.all(keys[lo] == keys[hi - 1])
+
+
+def test_readding_embedding_reuses_row():
+    index = LSHIndex(num_tables=1, hash_size=8)
+    (embedding_id,) = _ids(1)
+    index.add(embedding_id, [3])
+    index.add(embedding_id, [4])
+
+    assert len(index) == 1
+    assert index.lookup([3]).tolist() == []
+    assert index.lookup([4]).tolist() == [0]
+
+
+@pytest.mark.parametrize("flush_between", [False, True])
+def test_adding_same_embedding_twice_counts_once(flush_between):
+    index = LSHIndex(num_tables=3, hash_size=8)
+    first, second = _ids(2)
+    index.add(first, [1, 2, 3])
+    index.add(second, [1, 5, 6])
+    if flush_between:
+        index.lookup([1, 2, 3])
+    index.add(first, [1, 2, 3])
+
+    _, rows, lo, hi = index.lookup_ranges([1, 2, 3])
+    counts, candidates = count_range_hits(rows, lo, hi, len(index), 1)
+    assert len(index) == 2
+    assert counts.tolist() == [3, 1]
+    assert candidates.tolist() == [0, 1]
+
+
+def test_add_hash_replaces_hash_in_table():
+    index = LSHIndex(num_tables=2, hash_size=8)
+    (embedding_id,) = _ids(1)
+    index.add_hash(embedding_id, 0, 3)
+    index.add_hash(embedding_id, 1, 3)
+    index.add_hash(embedding_id, 0, 4)
+    index.add_hash(embedding_id, 0, 4)
+
+    assert index.lookup([3, 3]).tolist() == [0]
+    assert index.lookup([4, 3]).tolist() == [0, 0]
+
+
+def test_rejects_keys_wider_than_64_bits():
+    with pytest.raises(ValueError):
+        LSHIndex(num_tables=2, hash_size=64)
+    LSHIndex(num_tables=1, hash_size=64)
+
+
+@pytest.mark.parametrize("radius", [0, 1, 2])
+def test_probe_lookup_matches_naive(radius):
+    rng = np.random.default_rng(radius)
+    hash_size = 6
+    entries = rng.integers(0, 1 << hash_size, size=(200, 3)).tolist()
+    index = LSHIndex(num_tables=3, hash_size=hash_size)
+    for embedding_id, hashes in zip(_ids(200), entries):
+        index.add(embedding_id, hashes)
+
+    masks = _probe_masks(hash_size, radius, None)
+    for query in rng.integers(0, 1 << hash_size, size=(5, 3)).tolist():
+        assert Counter(index.lookup(query, masks).tolist()) == _naive_lookup(entries, query, hash_size, radius)
+
+
+def _naive_probes(hash_value, hash_size, radius):
+    probes = []
+    for flips in range(min(radius, hash_size) + 1):
+        for bits in combinations(range(hash_size), flips):
+            probes.append(hash_value ^ sum(1 << bit for bit in bits))
+    return probes
+
+
+@pytest.mark.parametrize("hash_size,radius", [(1, 0), (1, 3), (4, 1), (8, 2), (16, 2), (5, 5)])
+def test_multi_probe_matches_naive(hash_size, radius):
+    hash_value = (1 << hash_size) - 2
+    probes = list(multi_probe(hash_value, hash_size, radius))
+
+    assert probes == _naive_probes(hash_value, hash_size, radius)
+    assert probes[0] == hash_value
+    assert len(set(probes)) == len(probes)
+
+
+def test_multi_probe_budget():
+    assert list(multi_probe(0, 16, 2, max_probes=5)) == [0, 1, 2, 4, 8]
+    assert list(multi_probe(0, 16, 2, max_probes=0)) == []
+    assert len(list(multi_probe(0, 16, 2, max_probes=1000))) == 1 + 16 + 120
+
+
+def test_probe_masks():
+    masks = _probe_masks(16, 2, None)
+    assert masks.dtype == np.uint64
+    assert masks.tolist() == _naive_probes(0, 16, 2)
+    assert _probe_masks(16, 2, 32).tolist() == masks[:32].tolist()
+    assert not masks.flags.writeable
+    assert _probe_masks(16, 2, None) is masks
+    assert _probe_masks(64, 1, None)[-1] == np.uint64(1 << 63)
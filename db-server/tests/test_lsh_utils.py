@@ -0,0 +1,66 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.services.lsh_utils import count_range_hits
+
+
+def _naive(rows, lo, hi, num_rows, min_matches):
+    counts = Counter(rows[j] for start, end in zip(lo, hi) for j in range(start, end))
+    return counts, [row for row in range(num_rows) if counts[row] >= min_matches]
+
+
+def _ranges(rng, size, count):
+    bounds = np.sort(rng.choice(size + 1, size=(count, 2)), axis=1)
+    return bounds[:, 0].astype(np.int64), bounds[:, 1].astype(np.int64)
+
+
+@pytest.mark.parametrize("min_matches", [1, 2, 3])
+def test_count_range_hits_matches_naive(min_matches):
+    rng = np.random.default_rng(min_matches)
+    num_rows = 100
+    rows = rng.integers(0, num_rows, size=400).astype(np.uint32)
+    lo, hi = _ranges(rng, len(rows), 12)
+
+    counts, candidates = count_range_hits(rows, lo, hi, num_rows, min_matches)
+    expected_counts, expected_candidates = _naive(rows.tolist(), lo, hi, num_rows, min_matches)
+
+    assert counts.tolist() == [expected_counts[row] for row in range(num_rows)]
+    assert candidates.tolist() == expected_candidates
+    assert candidates.dtype == np.int64
+
+
+def test_count_range_hits_empty():
+    empty = np.empty(0, dtype=np.int64)
+
+    counts, candidates = count_range_hits(np.empty(0, dtype=np.uint32), empty, empty, 0, 1)
+    assert len(counts) == 0 and len(candidates) == 0
+
+    counts, candidates = count_range_hits(np.arange(5, dtype=np.uint32), empty, empty, 5, 1)
+    assert counts.tolist() == [0] * 5
+    assert len(candidates) == 0
+
+
+def test_count_range_hits_single_row():
+    rows = np.zeros(3, dtype=np.uint32)
+    lo = np.array([0, 1, 2], dtype=np.int64)
+    hi = np.array([1, 2, 3], dtype=np.int64)
+
+    counts, candidates = count_range_hits(rows, lo, hi, 1, 3)
+    assert counts.tolist() == [3]
+    assert candidates.tolist() == [0]
+
+    _, candidates = count_range_hits(rows, lo, hi, 1, 4)
+    assert len(candidates) == 0
+
+
+def test_count_range_hits_last_row():
+    # Rows past the highest hit are skipped by the scan, the highest is not
+    rows = np.array([7, 3, 7], dtype=np.uint32)
+    lo = np.array([0, 2], dtype=np.int64)
+    hi = np.array([1, 3], dtype=np.int64)
+
+    counts, candidates = count_range_hits(rows, lo, hi, 8, 2)
+    assert counts[7] == 2
+    assert candidates.tolist() == [7]
@@ -138,8 +138,8 @@ INSERT INTO search_requests (
 ) VALUES (
     'c47b2e8a-5d4f-4b2a-9c3d-8e7f6a5b4c3d',
     E'\\xFEDCBA9876543210...'::BYTEA,
-    ARRAY[11111, 22222, 33333, 44444, 55555, 66666, 77777, 88888, 99999, 10101,
-          12121, 13131, 14141, 15151, 16161, 17171, 18181, 19191, 20201, 21211],
+    -- 20 hashes (11111, 22222, ..., 222220), 8 bytes each as little-endian uint64
+    E'\\x672b000000000000ce5600000000000035820000000000009cad00000000000003d90000000000006a04010000000000d12f010000000000385b0100000000009f8601000000000006b20100000000006ddd010000000000d4080200000000003b34020000000000a25f020000000000098b02000000000070b6020000000000d7e10200000000003e0d030000000000a5380300000000000c64030000000000'::BYTEA,
     10,
     100,
     87,
@@ -166,7 +166,7 @@ CREATE TABLE search_requests (
     
     -- Search parameters
     encrypted_query BYTEA NOT NULL,
-    lsh_hashes INTEGER[] NOT NULL,
+    lsh_hashes BYTEA NOT NULL,  -- num_tables little-endian uint64 values (8 bytes each)
     top_k INTEGER NOT NULL,
     rerank_candidates INTEGER NOT NULL,
     
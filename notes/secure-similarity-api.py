@@ -5,23 +5,35 @@ Using LSH + Homomorphic Encryption
 API Design and Data Structures
 """
 
-from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass, asdict
+from typing import Any, List, Dict, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+import array
 import json
-import base64
+import math
+import pybase64
+import hashlib
+import heapq
+import operator
+import struct
 import numpy as np
+import numba
+from numba.typed import List as TypedList
 import tenseal as ts
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import asyncio
-import aiohttp
+import os
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 
 
 # ============= DATA MODELS =============
 
 class InitRequest(BaseModel):
     """Initial handshake to establish HE context"""
-    context_params: Dict[str, any]  # Serialized TenSEAL context parameters
+    context_params: Dict[str, Any]  # Serialized TenSEAL context parameters
     embedding_dim: int = 384
     lsh_config: Dict[str, int] = {
         "num_tables": 20,
@@ -35,13 +47,14 @@ class InitResponse(BaseModel):
     server_id: str
     max_db_size: int
     supported_operations: List[str]
+    lsh_seed_b64: str  # Base64 encoded 32-byte seed for generate_random_planes
 
 
 class AddEmbeddingRequest(BaseModel):
     """Add encrypted embedding to server database"""
     encrypted_embedding: str  # Base64 encoded encrypted vector
     lsh_hashes: List[int]     # LSH hashes (safe to send in plaintext)
-    metadata: Optional[Dict[str, any]] = None
+    metadata: Optional[Dict[str, Any]] = None
     embedding_id: Optional[str] = None
 
 
@@ -58,13 +71,16 @@ class SearchRequest(BaseModel):
     lsh_hashes: List[int]     # LSH hashes of query
     top_k: int = 10          # Number of results to return
     rerank_candidates: int = 100  # How many LSH candidates to check with HE
+    packed: bool = False     # Accept SLOT_PRODUCTS results (one HE product per pack)
 
 
 class SearchResult(BaseModel):
     """Individual search result"""
     embedding_id: str
     encrypted_similarity: str  # Base64 encoded encrypted similarity score
-    metadata: Optional[Dict[str, any]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    pack_slot: Optional[int] = None  # Block of encrypted_similarity holding this result
+    similarity_encoding: str = "dot_product"  # DOT_PRODUCT or SLOT_PRODUCTS
 
 
 class SearchResponse(BaseModel):
@@ -74,6 +90,188 @@ class SearchResponse(BaseModel):
     search_time_ms: float
 
 
+# What encrypted_similarity decrypts to: the dot product in slot 0, or the
+# slot-wise products of a whole pack with this result's block at pack_slot
+DOT_PRODUCT = "dot_product"
+SLOT_PRODUCTS = "slot_products"
+
+
+# ============= BINARY WIRE FORMAT =============
+
+_U32 = struct.Struct("<I")
+
+
+def pack_frame(lsh_hashes: List[int], ciphertext: bytes, fields: Dict) -> bytes:
+    """
+    Frame a raw ciphertext for the binary endpoints
+    
+    Layout (little-endian):
+    uint32 num_hashes || num_hashes * uint32 hashes || uint32 ct_len ||
+    ct_bytes || UTF-8 JSON object with the remaining request fields
+    
+    Raises:
+        OverflowError: If a hash does not fit in uint32
+    """
+    # struct range-checks every value; numpy casts would wrap silently
+    try:
+        hashes = struct.pack(f"<{len(lsh_hashes)}I", *lsh_hashes)
+    except struct.error as e:
+        raise OverflowError(f"LSH hashes must fit in uint32: {e}") from None
+    return b"".join((
+        _U32.pack(len(lsh_hashes)),
+        hashes,
+        _U32.pack(len(ciphertext)),
+        ciphertext,
+        json.dumps(fields, separators=(",", ":")).encode()
+    ))
+
+
+def unpack_frame(body: bytes) -> Tuple[List[int], bytes, Dict]:
+    """Split a binary request body into (lsh_hashes, ciphertext, fields)"""
+    (num_hashes,) = _U32.unpack_from(body, 0)
+    offset = _U32.size
+    lsh_hashes = np.frombuffer(body, dtype="<u4", count=num_hashes, offset=offset).tolist()
+    offset += 4 * num_hashes
+    
+    (ct_len,) = _U32.unpack_from(body, offset)
+    offset += _U32.size
+    ciphertext = body[offset:offset + ct_len]
+    if len(ciphertext) != ct_len:
+        raise ValueError("Truncated ciphertext in request body")
+    offset += ct_len
+    
+    fields = json.loads(body[offset:]) if offset < len(body) else {}
+    return lsh_hashes, ciphertext, fields
+
+
+# ============= SERVER STORAGE =============
+
+@dataclass
+class EmbeddingStore:
+    """
+    Struct-of-arrays storage for the server's rows, indexed by index_position
+    
+    IDs and metadata live in preallocated arrays that grow by doubling, so
+    candidate rows are fetched with one fancy-index gather. Deserialized
+    ciphertexts stay in a plain list.
+    """
+    ids: np.ndarray = field(default_factory=lambda: np.empty(1024, dtype=object))
+    metadata: np.ndarray = field(default_factory=lambda: np.empty(1024, dtype=object))
+    cts: List[ts.CKKSVector] = field(default_factory=list)
+    
+    def __len__(self) -> int:
+        return len(self.cts)
+    
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+    
+    def append(self,
+               embedding_id: str,
+               metadata: Dict,
+               ciphertext: ts.CKKSVector) -> int:
+        """Store one row and return its index_position"""
+        position = len(self.cts)
+        if position == self.capacity:
+            self.ids = np.concatenate((self.ids, np.empty_like(self.ids)))
+            self.metadata = np.concatenate((self.metadata, np.empty_like(self.metadata)))
+        self.ids[position] = embedding_id
+        self.metadata[position] = metadata
+        # Appended last so len() only counts fully written rows
+        self.cts.append(ciphertext)
+        return position
+
+
+# ============= LSH POSTINGS =============
+
+@numba.njit(cache=True)
+def count_postings(postings, num_rows):
+    """
+    Count, for every row in any posting, how many postings contain it
+    
+    Each table contributes one posting and holds a row at most once, so a
+    row's count is the number of tables whose hash matches the query.
+    Every posting is walked in full: ranking by count has to see rows at
+    any position, not only the lowest ones.
+    
+    Args:
+        postings: numba typed List of int32 row arrays
+        num_rows: Upper bound (exclusive) on the row indices
+        
+    Returns:
+        Tuple of (rows, counts): each row present in some posting, in
+        first-seen order, and its number of postings
+    """
+    counts = np.zeros(num_rows, dtype=np.int32)
+    total = 0
+    for posting in postings:
+        total += len(posting)
+    rows = np.empty(total, dtype=np.int32)
+    
+    n = 0
+    for posting in postings:
+        for row in posting:
+            if counts[row] == 0:
+                rows[n] = row
+                n += 1
+            counts[row] += 1
+    rows = rows[:n]
+    return rows, counts[rows]
+
+
+def generate_random_planes(seed: bytes,
+                           num_tables: int,
+                           hash_size: int,
+                           embedding_dim: int) -> np.ndarray:
+    """
+    LSH hyperplanes derived from a shared seed
+    
+    Client and server each call this with the seed from /initialize, so the
+    planes themselves never cross the wire. float32 is plenty because only
+    the sign of each projection is used.
+    
+    Returns:
+        (num_tables, hash_size, embedding_dim) float32 planes
+    """
+    rng = np.random.default_rng(int.from_bytes(seed, "little"))
+    return rng.standard_normal((num_tables, hash_size, embedding_dim), dtype=np.float32)
+
+
+@numba.njit(parallel=True, cache=True)
+def _lsh_batch(vectors, planes_flat, hash_size):
+    """
+    Sign-bit LSH hashes for a batch of vectors in one kernel
+    
+    Single vectors are hashed through this kernel too. Without fastmath
+    each projection is summed in the same fixed order whatever the batch
+    size, so a row added in a batch gets exactly the bits it gets when
+    hashed alone at query time, even for projections near zero.
+    
+    Args:
+        vectors: (n, d) array
+        planes_flat: (num_tables * hash_size, d) hyperplanes
+        hash_size: Bits per table hash (at most 32)
+        
+    Returns:
+        (n, num_tables) uint32 hashes, bit i weighted 2**i, set when the
+        projection is >= 0 (same convention as the db-server)
+    """
+    n, d = vectors.shape
+    num_tables = planes_flat.shape[0] // hash_size
+    out = np.zeros((n, num_tables), dtype=np.uint32)
+    for i in numba.prange(n):
+        for table in range(num_tables):
+            h = np.uint32(0)
+            for bit in range(hash_size):
+                s = 0.0
+                for k in range(d):
+                    s += vectors[i, k] * planes_flat[table * hash_size + bit, k]
+                if s >= 0:
+                    h |= np.uint32(1) << np.uint32(bit)
+            out[i, table] = h
+    return out
+
+
 # ============= CLIENT IMPLEMENTATION =============
 
 class SecureSearchClient:
@@ -83,7 +281,20 @@ class SecureSearchClient:
         self.server_url = server_url
         self.embedding_dim = embedding_dim
         self.context = self._create_context()
-        self.session = None
+        # One pooled client for the whole session so adds and searches reuse
+        # keep-alive connections instead of reconnecting per call
+        self.session = httpx.AsyncClient(
+            base_url=server_url,
+            timeout=30.0,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=0,
+                limits=httpx.Limits(max_keepalive_connections=100)
+            )
+        )
+        # (num_tables, hash_size, embedding_dim) planes, regenerated from the
+        # seed the server returns on /initialize
+        self.random_planes: Optional[np.ndarray] = None
         
     def _create_context(self) -> ts.Context:
         """Create optimized TenSEAL context"""
@@ -103,56 +314,83 @@ class SecureSearchClient:
             "scheme": "CKKS",
             "poly_modulus_degree": 8192,
             "scale": 2**40,
-            "public_key": base64.b64encode(
+            "public_key": pybase64.b64encode_as_string(
                 self.context.serialize(save_public_key=True, save_secret_key=False)
-            ).decode('utf-8')
+            )
         }
     
-    def _encrypt_vector(self, vector: np.ndarray) -> str:
-        """Encrypt and encode vector for transmission"""
-        # Normalize
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
+    def _encrypt_vector(self, vector: np.ndarray) -> bytes:
+        """Encrypt and serialize vector for transmission"""
+        # Normalize with one dot product and one scale
+        vector = np.asarray(vector, dtype=np.float64)
+        sum_sq = float(np.dot(vector, vector))
+        if sum_sq > 0:
+            vector = vector * (1.0 / math.sqrt(sum_sq))
             
-        # Encrypt
-        encrypted = ts.ckks_vector(self.context, vector.tolist())
+        # Encrypt (TenSEAL takes the numpy array directly)
+        encrypted = ts.ckks_vector(self.context, vector)
         
-        # Serialize and encode
-        serialized = encrypted.serialize()
-        return base64.b64encode(serialized).decode('utf-8')
+        # Serialize; the binary endpoints carry the raw bytes
+        return encrypted.serialize()
     
     def _compute_lsh_hashes(self, vector: np.ndarray, 
                            random_planes: np.ndarray) -> List[int]:
         """Compute LSH hashes (client needs same random planes as server)"""
-        # This would be received from server during init
-        # For now, using a simplified version
-        norm = np.linalg.norm(vector)
-        if norm > 0:
-            vector = vector / norm
-            
-        # Simplified hash computation
-        hashes = []
-        for i in range(20):  # num_tables
-            # In practice, use the actual random planes from server
-            hash_val = hash(tuple(vector)) + i
-            hashes.append(hash_val % (2**16))
-        return hashes
+        if random_planes is None:
+            raise ValueError("LSH planes not available. Call initialize() first.")
+        
+        # Same kernel as the batch path, so both agree bit for bit
+        return self._compute_lsh_hashes_batch(np.asarray(vector)[None, :], random_planes)[0].tolist()
+    
+    def _compute_lsh_hashes_batch(self,
+                                  vectors: np.ndarray,
+                                  random_planes: np.ndarray) -> np.ndarray:
+        """Compute LSH hashes for every row of vectors, shape (n, num_tables)"""
+        if random_planes is None:
+            raise ValueError("LSH planes not available. Call initialize() first.")
+        
+        num_tables, hash_size, dim = random_planes.shape
+        planes_flat = np.ascontiguousarray(random_planes.reshape(num_tables * hash_size, dim))
+        vectors = np.ascontiguousarray(vectors, dtype=planes_flat.dtype)
+        return _lsh_batch(vectors, planes_flat, hash_size)
+    
+    async def _post(self, path: str, request: BaseModel) -> httpx.Response:
+        """POST a request model as a pre-serialized JSON body"""
+        # Pydantic serializes straight to JSON without building a dict first,
+        # and httpx gets raw bytes rather than re-encoding through json=
+        body = request.model_dump_json().encode()
+        return await self.session.post(
+            path,
+            content=body,
+            headers={"content-type": "application/json"}
+        )
+    
+    async def _post_frame(self, path: str, body: bytes) -> httpx.Response:
+        """POST a binary frame built by pack_frame"""
+        return await self.session.post(
+            path,
+            content=body,
+            headers={"content-type": "application/octet-stream"}
+        )
     
     async def initialize(self) -> Dict:
         """Initialize connection with server"""
-        self.session = aiohttp.ClientSession()
-        
         request = InitRequest(
             context_params=self._serialize_context(),
             embedding_dim=self.embedding_dim
         )
         
-        async with self.session.post(
-            f"{self.server_url}/initialize",
-            json=request.dict()
-        ) as response:
-            return await response.json()
+        response = await self._post("/initialize", request)
+        init_response = response.json()
+        
+        # Rebuild the server's LSH planes from the shared seed
+        self.random_planes = generate_random_planes(
+            pybase64.b64decode(init_response["lsh_seed_b64"], validate=False),
+            request.lsh_config["num_tables"],
+            request.lsh_config["hash_size"],
+            self.embedding_dim
+        )
+        return init_response
     
     async def add_embedding(self, 
                           embedding: np.ndarray, 
@@ -163,21 +401,51 @@ class SecureSearchClient:
         encrypted_embedding = self._encrypt_vector(embedding)
         
         # Compute LSH hashes
-        # In practice, server would send random planes during init
-        lsh_hashes = self._compute_lsh_hashes(embedding, None)
-        
-        request = AddEmbeddingRequest(
-            encrypted_embedding=encrypted_embedding,
-            lsh_hashes=lsh_hashes,
-            metadata=metadata,
-            embedding_id=embedding_id
-        )
+        lsh_hashes = self._compute_lsh_hashes(embedding, self.random_planes)
         
-        async with self.session.post(
-            f"{self.server_url}/add_embedding",
-            json=request.dict()
-        ) as response:
-            return await response.json()
+        body = pack_frame(lsh_hashes, encrypted_embedding, {
+            "metadata": metadata,
+            "embedding_id": embedding_id
+        })
+        
+        response = await self._post_frame("/add_embedding_bin", body)
+        return response.json()
+    
+    async def add_embeddings_batch(self,
+                                   embeddings: np.ndarray,
+                                   metadata: Optional[List[Dict]] = None,
+                                   embedding_ids: Optional[List[str]] = None,
+                                   max_in_flight: int = 16) -> List[Dict]:
+        """
+        Add many embeddings, hashing the whole matrix in one LSH kernel call
+        
+        Rows are encrypted and sent one at a time per slot, with at most
+        max_in_flight requests outstanding, so neither the ciphertexts nor
+        the open requests grow with the batch size.
+        
+        Args:
+            embeddings: (n, embedding_dim) matrix, one embedding per row
+            metadata: Optional per-row metadata
+            embedding_ids: Optional per-row IDs
+            max_in_flight: Maximum concurrent add requests
+            
+        Returns:
+            Server responses in row order
+        """
+        embeddings = np.asarray(embeddings)
+        lsh_hashes = self._compute_lsh_hashes_batch(embeddings, self.random_planes)
+        semaphore = asyncio.Semaphore(max_in_flight)
+        
+        async def add_row(i: int) -> Dict:
+            async with semaphore:
+                body = pack_frame(lsh_hashes[i], self._encrypt_vector(embeddings[i]), {
+                    "metadata": metadata[i] if metadata else None,
+                    "embedding_id": embedding_ids[i] if embedding_ids else None
+                })
+                response = await self._post_frame("/add_embedding_bin", body)
+                return response.json()
+        
+        return await asyncio.gather(*(add_row(i) for i in range(len(embeddings))))
     
     async def search(self, 
                     query_embedding: np.ndarray, 
@@ -187,30 +455,29 @@ class SecureSearchClient:
         encrypted_query = self._encrypt_vector(query_embedding)
         
         # Compute LSH hashes
-        lsh_hashes = self._compute_lsh_hashes(query_embedding, None)
+        lsh_hashes = self._compute_lsh_hashes(query_embedding, self.random_planes)
         
-        request = SearchRequest(
-            encrypted_query=encrypted_query,
-            lsh_hashes=lsh_hashes,
-            top_k=top_k
-        )
+        body = pack_frame(lsh_hashes, encrypted_query, {"top_k": top_k, "packed": True})
         
         # Send search request
-        async with self.session.post(
-            f"{self.server_url}/search",
-            json=request.dict()
-        ) as response:
-            search_response = SearchResponse(**await response.json())
+        response = await self._post_frame("/search_bin", body)
+        search_response = SearchResponse.model_validate_json(response.content)
         
         # Decrypt results
         results = []
         for result in search_response.results:
-            # Decode and deserialize encrypted similarity
-            encrypted_sim = base64.b64decode(result.encrypted_similarity)
+            # Decode, deserialize and decrypt the encrypted similarity
+            encrypted_sim = pybase64.b64decode(result.encrypted_similarity, validate=False)
+            decrypted = ts.ckks_vector_from(self.context, encrypted_sim).decrypt()
             
-            # In practice, deserialize back to TenSEAL vector
-            # For demo, using placeholder
-            similarity_score = 0.95  # Would be: ts_vector.decrypt()[0]
+            if result.similarity_encoding == DOT_PRODUCT:
+                similarity_score = decrypted[0]
+            elif result.similarity_encoding == SLOT_PRODUCTS:
+                # Packed result: sum this embedding's block of slot-wise products
+                start = result.pack_slot * self.embedding_dim
+                similarity_score = float(sum(decrypted[start:start + self.embedding_dim]))
+            else:
+                raise ValueError(f"Unknown similarity encoding: {result.similarity_encoding}")
             
             results.append((
                 result.embedding_id,
@@ -218,14 +485,12 @@ class SecureSearchClient:
                 result.metadata or {}
             ))
         
-        # Sort by similarity (highest first)
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:top_k]
+        # Top k by similarity (highest first) without sorting every candidate
+        return heapq.nlargest(top_k, results, key=operator.itemgetter(1))
     
     async def close(self):
         """Close client session"""
-        if self.session:
-            await self.session.close()
+        await self.session.aclose()
 
 
 # ============= SERVER IMPLEMENTATION =============
@@ -234,14 +499,28 @@ class SecureSearchServer:
     """Server for privacy-preserving similarity search"""
     
     def __init__(self):
-        self.app = FastAPI(title="Secure Similarity Search API")
+        self.app = FastAPI(
+            title="Secure Similarity Search API",
+            default_response_class=ORJSONResponse
+        )
         self.initialized = False
         self.context = None
         self.lsh_index = None
-        self.encrypted_db: List[bytes] = []
-        self.metadata_db: List[Dict] = []
-        self.embedding_ids: List[str] = []
+        # Ciphertexts are deserialized once at insertion; searches multiply
+        # the query against packs of pack_capacity consecutive rows
+        self.store = EmbeddingStore()
         self.random_planes = None
+        self.embedding_dim = None
+        self.pack_capacity = 1
+        self.packs: Dict[int, Tuple[ts.CKKSVector, int]] = {}  # pack index -> (packed rows, row count)
+        
+        # SEAL releases the GIL, so HE products run on worker threads
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        
+        # Recently seen queries (retries, repeated searches): blake2b digest
+        # of the serialized query -> (query vector, replicated query by pack size)
+        self.query_cache: "OrderedDict[bytes, Tuple[ts.CKKSVector, Dict[int, ts.CKKSVector]]]" = OrderedDict()
+        self.query_cache_size = 128
         
         self._setup_routes()
     
@@ -253,9 +532,16 @@ class SecureSearchServer:
             """Initialize server with client's HE context"""
             try:
                 # Deserialize context (public key only)
-                context_bytes = base64.b64decode(request.context_params["public_key"])
+                context_bytes = pybase64.b64decode(request.context_params["public_key"], validate=False)
                 self.context = ts.context_from(context_bytes)
                 
+                # Rows packed side by side per ciphertext (slots = N / 2)
+                slot_count = self.context.seal_context().data.key_context_data().parms().poly_modulus_degree() // 2
+                self.embedding_dim = request.embedding_dim
+                self.pack_capacity = max(1, slot_count // request.embedding_dim)
+                self.packs = {}
+                self.query_cache.clear()
+                
                 # Initialize LSH
                 from dataclasses import dataclass
                 @dataclass
@@ -268,8 +554,11 @@ class SecureSearchServer:
                 self.lsh_config = LSHConfig()
                 self.lsh_tables = [{} for _ in range(self.lsh_config.num_tables)]
                 
-                # Generate random planes for LSH
-                self.random_planes = np.random.randn(
+                # Generate random planes for LSH from a fresh seed; only the
+                # seed is returned to the client
+                lsh_seed = os.urandom(32)
+                self.random_planes = generate_random_planes(
+                    lsh_seed,
                     self.lsh_config.num_tables,
                     self.lsh_config.hash_size,
                     request.embedding_dim
@@ -280,96 +569,289 @@ class SecureSearchServer:
                 return InitResponse(
                     server_id="server-001",
                     max_db_size=100000,
-                    supported_operations=["add_embedding", "search", "batch_search"]
+                    supported_operations=["add_embedding", "add_embedding_bin", "search", "search_bin", "batch_search"],
+                    lsh_seed_b64=pybase64.b64encode_as_string(lsh_seed)
                 )
                 
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
         
-        @self.app.post("/add_embedding", response_model=AddEmbeddingResponse)
+        @self.app.post("/add_embedding", response_model=AddEmbeddingResponse, response_model_exclude_unset=True)
         async def add_embedding(request: AddEmbeddingRequest):
             """Add encrypted embedding to database"""
             if not self.initialized:
                 raise HTTPException(status_code=400, detail="Server not initialized")
             
             try:
-                # Decode encrypted embedding
-                encrypted_embedding = base64.b64decode(request.encrypted_embedding)
-                
-                # Generate ID if not provided
-                embedding_id = request.embedding_id or f"emb_{len(self.encrypted_db)}"
-                
-                # Store in database
-                index_position = len(self.encrypted_db)
-                self.encrypted_db.append(encrypted_embedding)
-                self.metadata_db.append(request.metadata or {})
-                self.embedding_ids.append(embedding_id)
-                
-                # Add to LSH index
-                for table_idx, hash_value in enumerate(request.lsh_hashes):
-                    if hash_value not in self.lsh_tables[table_idx]:
-                        self.lsh_tables[table_idx][hash_value] = set()
-                    self.lsh_tables[table_idx][hash_value].add(index_position)
-                
-                return AddEmbeddingResponse(
-                    embedding_id=embedding_id,
-                    index_position=index_position,
-                    status="success"
+                return self._add_embedding(
+                    pybase64.b64decode(request.encrypted_embedding, validate=False),
+                    request.lsh_hashes,
+                    request.metadata,
+                    request.embedding_id
                 )
-                
             except Exception as e:
                 raise HTTPException(status_code=400, detail=str(e))
         
-        @self.app.post("/search", response_model=SearchResponse)
+        @self.app.post("/add_embedding_bin", response_model=AddEmbeddingResponse, response_model_exclude_unset=True)
+        async def add_embedding_bin(request: Request):
+            """Add encrypted embedding sent as a binary frame (see pack_frame)"""
+            if not self.initialized:
+                raise HTTPException(status_code=400, detail="Server not initialized")
+            
+            try:
+                lsh_hashes, encrypted_embedding, fields = unpack_frame(await request.body())
+                return self._add_embedding(
+                    encrypted_embedding,
+                    lsh_hashes,
+                    fields.get("metadata"),
+                    fields.get("embedding_id")
+                )
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
+        @self.app.post("/search", response_model=SearchResponse, response_model_exclude_unset=True)
         async def search(request: SearchRequest):
             """Search for similar embeddings"""
             if not self.initialized:
                 raise HTTPException(status_code=400, detail="Server not initialized")
             
-            import time
-            start_time = time.time()
+            try:
+                return await self._search(
+                    pybase64.b64decode(request.encrypted_query, validate=False),
+                    request.lsh_hashes,
+                    request.top_k,
+                    request.rerank_candidates,
+                    request.packed
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=str(e))
+        
+        @self.app.post("/search_bin", response_model=SearchResponse, response_model_exclude_unset=True)
+        async def search_bin(request: Request):
+            """Search with a query sent as a binary frame (see pack_frame)"""
+            if not self.initialized:
+                raise HTTPException(status_code=400, detail="Server not initialized")
             
             try:
-                # Step 1: Find candidates using LSH
-                candidates = set()
-                for table_idx, hash_value in enumerate(request.lsh_hashes):
-                    if hash_value in self.lsh_tables[table_idx]:
-                        candidates.update(self.lsh_tables[table_idx][hash_value])
-                
-                # Limit candidates
-                candidates = list(candidates)[:request.rerank_candidates]
-                
-                # Step 2: Compute encrypted similarities for candidates
-                encrypted_query = base64.b64decode(request.encrypted_query)
-                
-                results = []
-                for idx in candidates:
-                    # In practice: deserialize vectors and compute dot product
-                    # encrypted_sim = query_vec.dot(db_vec)
-                    
-                    # For demo, create placeholder encrypted similarity
-                    encrypted_sim = base64.b64encode(b"encrypted_similarity").decode('utf-8')
-                    
-                    results.append(SearchResult(
-                        embedding_id=self.embedding_ids[idx],
-                        encrypted_similarity=encrypted_sim,
-                        metadata=self.metadata_db[idx]
-                    ))
-                
-                # Note: Server cannot sort by similarity (encrypted)
-                # Client will decrypt and sort
-                
-                search_time = (time.time() - start_time) * 1000
-                
-                return SearchResponse(
-                    results=results[:request.top_k * 2],  # Return more for client to sort
-                    candidates_checked=len(candidates),
-                    search_time_ms=search_time
+                lsh_hashes, encrypted_query, fields = unpack_frame(await request.body())
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            try:
+                return await self._search(
+                    encrypted_query,
+                    lsh_hashes,
+                    fields.get("top_k", 10),
+                    fields.get("rerank_candidates", 100),
+                    fields.get("packed", False)
                 )
-                
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
     
+    def _add_embedding(self,
+                       encrypted_embedding: bytes,
+                       lsh_hashes: List[int],
+                       metadata: Optional[Dict],
+                       embedding_id: Optional[str]) -> AddEmbeddingResponse:
+        """Store a serialized ciphertext and index its LSH hashes"""
+        # Generate ID if not provided
+        embedding_id = embedding_id or f"emb_{len(self.store)}"
+        
+        # Store in database
+        index_position = self.store.append(
+            embedding_id,
+            metadata or {},
+            ts.ckks_vector_from(self.context, encrypted_embedding)
+        )
+        
+        # Add to LSH index. Postings are flat int32 arrays: positions only
+        # grow, so each bucket stays sorted and duplicate-free without a set
+        for table_idx, hash_value in enumerate(lsh_hashes):
+            posting = self.lsh_tables[table_idx].get(hash_value)
+            if posting is None:
+                posting = self.lsh_tables[table_idx][hash_value] = array.array('i')
+            posting.append(index_position)
+        
+        return AddEmbeddingResponse(
+            embedding_id=embedding_id,
+            index_position=index_position,
+            status="success"
+        )
+    
+    def _get_pack(self, pack_idx: int, count: int) -> ts.CKKSVector:
+        """
+        Packed ciphertext for the first count rows of pack pack_idx
+        
+        Rows sit side by side, embedding_dim slots each. TenSEAL's Python API
+        has no slot rotations, so blocks are summed by the client after
+        decryption rather than with rotate-and-add on the server. Rows are
+        append-only, so a cached pack is current while its row count matches.
+        """
+        cached = self.packs.get(pack_idx)
+        if cached is not None and cached[1] == count:
+            return cached[0]
+        
+        start = pack_idx * self.pack_capacity
+        pack = ts.CKKSVector.pack_vectors(self.store.cts[start:start + count])
+        self.packs[pack_idx] = (pack, count)
+        return pack
+    
+    def _multiply_pack(self,
+                       replicated_query: ts.CKKSVector,
+                       pack_idx: int,
+                       count: int) -> str:
+        """Encrypted slot-wise products of the query and one pack (runs on the executor)"""
+        product = replicated_query * self._get_pack(pack_idx, count)
+        return pybase64.b64encode_as_string(product.serialize())
+    
+    def _dot_row(self, query_vec: ts.CKKSVector, row: int) -> str:
+        """Encrypted dot product of the query and one row (runs on the executor)"""
+        return pybase64.b64encode_as_string(query_vec.dot(self.store.cts[row]).serialize())
+    
+    def _deserialize_query(self, encrypted_query: bytes) -> Tuple[ts.CKKSVector, Dict[int, ts.CKKSVector]]:
+        """
+        Deserialized query and its replicated forms, LRU-cached by content
+        
+        Keyed by a 16-byte blake2b digest rather than the ciphertext itself,
+        so lookups hash the payload once and the cache holds short keys.
+        The replicated dict is filled in lazily by _search.
+        """
+        key = hashlib.blake2b(encrypted_query, digest_size=16).digest()
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            self.query_cache.move_to_end(key)
+            return cached
+        
+        cached = (ts.ckks_vector_from(self.context, encrypted_query), {})
+        self.query_cache[key] = cached
+        if len(self.query_cache) > self.query_cache_size:
+            self.query_cache.popitem(last=False)
+        return cached
+    
+    def _find_candidates(self, lsh_hashes: List[int], limit: int) -> np.ndarray:
+        """
+        Rank rows by how many tables their hash matches the query's
+        
+        The match count is a coarse plaintext similarity computed from the
+        hashes the client already sends, so only the best limit candidates
+        go through HE scoring and back over the wire. The int32 views only
+        live for this call: an array.array cannot grow while a buffer
+        export is alive, and adds can interleave with a search once it
+        awaits the executor.
+        
+        Returns:
+            At most limit rows, most matching tables first (ties in row order)
+        """
+        postings = TypedList()
+        for table_idx, hash_value in enumerate(lsh_hashes):
+            posting = self.lsh_tables[table_idx].get(hash_value)
+            if posting:
+                postings.append(np.frombuffer(posting, dtype=np.int32))
+        
+        if not len(postings) or limit <= 0:
+            return np.empty(0, dtype=np.int32)
+        
+        # Fewest missed tables first, then lowest row, as one int64 key so
+        # the partition already breaks ties the same way as the final sort
+        num_rows = len(self.store)
+        rows, counts = count_postings(postings, num_rows)
+        keys = (len(postings) - counts.astype(np.int64)) * num_rows + rows
+        if len(keys) > limit:
+            keys = keys[np.argpartition(keys, limit - 1)[:limit]]
+        return np.sort(keys) % num_rows
+    
+    async def _search(self,
+                      encrypted_query: bytes,
+                      lsh_hashes: List[int],
+                      top_k: int,
+                      rerank_candidates: int,
+                      packed: bool = False) -> SearchResponse:
+        """
+        LSH candidate lookup followed by encrypted scoring of each candidate
+        
+        Unless packed, every result holds its own encrypted dot product.
+        Packed searches do one HE multiplication per pack holding candidates
+        and return SLOT_PRODUCTS results, which the client reduces itself.
+        """
+        import time
+        start_time = time.time()
+        
+        # Step 1: Find candidates using LSH, keeping the rerank_candidates
+        # sharing the most table hashes with the query
+        candidates = self._find_candidates(lsh_hashes, rerank_candidates)
+        
+        # Step 2: Compute encrypted similarities, spread across the executor
+        query_vec, replicated_queries = self._deserialize_query(encrypted_query)
+        loop = asyncio.get_running_loop()
+        
+        if not packed:
+            similarities = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, self._dot_row, query_vec, row)
+                for row in candidates.tolist()
+            ))
+            results = [
+                SearchResult(
+                    embedding_id=embedding_id,
+                    encrypted_similarity=similarity,
+                    metadata=metadata
+                )
+                for embedding_id, metadata, similarity in zip(
+                    self.store.ids[candidates].tolist(),
+                    self.store.metadata[candidates].tolist(),
+                    similarities
+                )
+            ]
+            return SearchResponse(
+                results=results[:top_k * 2],  # Return more for client to sort
+                candidates_checked=len(candidates),
+                search_time_ms=(time.time() - start_time) * 1000
+            )
+        
+        # One HE multiplication per pack containing candidates
+        candidate_packs, candidate_slots = np.divmod(candidates, self.pack_capacity)
+        pack_ids = np.unique(candidate_packs).tolist()
+        
+        # Only the last pack can be partial; replicate the query once per size
+        db_size = len(self.store)
+        pack_counts = [min(self.pack_capacity, db_size - pack_idx * self.pack_capacity) for pack_idx in pack_ids]
+        for count in set(pack_counts):
+            if count not in replicated_queries:
+                replicated_queries[count] = ts.CKKSVector.pack_vectors([query_vec] * count)
+        
+        products = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self._multiply_pack, replicated_queries[count], pack_idx, count)
+            for pack_idx, count in zip(pack_ids, pack_counts)
+        ))
+        pack_products = dict(zip(pack_ids, products))
+        
+        # Gather candidate fields from the store in one pass each
+        results = [
+            SearchResult(
+                embedding_id=embedding_id,
+                encrypted_similarity=pack_products[pack_idx],
+                metadata=metadata,
+                pack_slot=slot,
+                similarity_encoding=SLOT_PRODUCTS
+            )
+            for embedding_id, metadata, pack_idx, slot in zip(
+                self.store.ids[candidates].tolist(),
+                self.store.metadata[candidates].tolist(),
+                candidate_packs.tolist(),
+                candidate_slots.tolist()
+            )
+        ]
+        
+        # Note: Server cannot sort by similarity (encrypted)
+        # Client will decrypt and sort
+        
+        search_time = (time.time() - start_time) * 1000
+        
+        return SearchResponse(
+            results=results[:top_k * 2],  # Return more for client to sort
+            candidates_checked=len(candidates),
+            search_time_ms=search_time
+        )
+    
     def run(self, host: str = "0.0.0.0", port: int = 8000):
         """Run the server"""
         import uvicorn
@@ -389,13 +871,11 @@ async def example_usage():
     
     # Add some embeddings
     print("Adding embeddings to server...")
-    for i in range(1000):
-        embedding = np.random.randn(384)
-        await client.add_embedding(
-            embedding,
-            metadata={"text": f"Sentence {i}", "category": "example"},
-            embedding_id=f"sent_{i}"
-        )
+    await client.add_embeddings_batch(
+        np.random.randn(1000, 384),
+        metadata=[{"text": f"Sentence {i}", "category": "example"} for i in range(1000)],
+        embedding_ids=[f"sent_{i}" for i in range(1000)]
+    )
     
     # Search for similar embeddings
     print("\nSearching for similar embeddings...")
@@ -433,8 +913,12 @@ DATA FLOW AND API CALLS:
    Server → Client: {
      "server_id": "server-001",
      "max_db_size": 100000,
-     "supported_operations": ["add_embedding", "search", "batch_search"]
+     "supported_operations": ["add_embedding", "search", "batch_search"],
+     "lsh_seed_b64": "base64_encoded_32_byte_seed"
    }
+   
+   Both sides regenerate the LSH planes from the seed
+   (generate_random_planes); the planes themselves are never sent.
 
 2. ADD EMBEDDING:
    Client → Server: {
@@ -455,7 +939,8 @@ DATA FLOW AND API CALLS:
      "encrypted_query": "base64_encoded_encrypted_query",
      "lsh_hashes": [11111, 22222, ...],  // 20 hash values
      "top_k": 10,
-     "rerank_candidates": 100
+     "rerank_candidates": 100,
+     "packed": false  // true: one HE product per pack, see below
    }
    
    Server → Client: {
@@ -470,6 +955,17 @@ DATA FLOW AND API CALLS:
      "candidates_checked": 87,
      "search_time_ms": 1250.5
    }
+   
+   With "packed": true, results also carry "pack_slot" and
+   "similarity_encoding": "slot_products": encrypted_similarity then holds
+   the slot-wise products of a whole pack, and the client sums the
+   embedding_dim-wide block at pack_slot after decryption.
+
+4. BINARY VARIANTS (/add_embedding_bin, /search_bin):
+   Same requests as 2 and 3, sent as application/octet-stream without
+   base64: uint32 num_hashes || uint32 hashes || uint32 ct_len || raw
+   ciphertext || JSON of the remaining fields ({"metadata", "embedding_id"}
+   or {"top_k", "rerank_candidates", "packed"}). Responses are unchanged.
 
 KEY SECURITY PROPERTIES:
 - Server never sees plaintext embeddings
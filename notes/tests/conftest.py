@@ -0,0 +1,18 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+# The module file name has a hyphen, so load it from its path rather than by import
+_API_PATH = Path(__file__).resolve().parents[1] / "secure-similarity-api.py"
+
+
+@pytest.fixture(scope="session")
+def api():
+    spec = importlib.util.spec_from_file_location("secure_similarity_api", _API_PATH)
+    module = importlib.util.module_from_spec(spec)
+    # Registered before executing so numba's on-disk cache can resolve the module
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
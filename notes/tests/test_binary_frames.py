@@ -0,0 +1,70 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+
+def _naive_frame(lsh_hashes, ciphertext, fields):
+    return (
+        struct.pack(f"<I{len(lsh_hashes)}I", len(lsh_hashes), *lsh_hashes)
+        + struct.pack("<I", len(ciphertext))
+        + ciphertext
+        + json.dumps(fields).encode()
+    )
+
+
+@pytest.mark.parametrize("lsh_hashes,ciphertext,fields", [
+    ([1, 2, 3], b"\x00\x01ciphertext\xff", {"top_k": 5, "packed": True}),
+    ([0, 2**32 - 1], b"x" * 70_000, {"metadata": {"text": "café"}, "embedding_id": "e1"}),
+    ([7], b"c", {}),
+    ([], b"", {"top_k": 1}),
+])
+def test_round_trip(api, lsh_hashes, ciphertext, fields):
+    body = api.pack_frame(lsh_hashes, ciphertext, fields)
+
+    assert api.unpack_frame(body) == (lsh_hashes, ciphertext, fields)
+    # Field JSON spacing aside, the layout matches a struct-built frame
+    assert api.unpack_frame(_naive_frame(lsh_hashes, ciphertext, fields)) == (lsh_hashes, ciphertext, fields)
+
+
+def test_missing_fields_default_to_empty(api):
+    body = struct.pack("<II", 1, 9) + struct.pack("<I", 2) + b"ct"
+
+    assert api.unpack_frame(body) == ([9], b"ct", {})
+
+
+@pytest.mark.parametrize("lsh_hashes", [[2**32], [-1], [1, 2**40]])
+def test_hashes_are_uint32(api, lsh_hashes):
+    with pytest.raises(OverflowError):
+        api.pack_frame(lsh_hashes, b"ct", {})
+
+
+def test_numpy_hashes(api):
+    hashes = np.array([3, 2**32 - 1], dtype=np.uint64)
+    assert api.unpack_frame(api.pack_frame(hashes, b"ct", {}))[0] == [3, 2**32 - 1]
+
+
+@pytest.mark.parametrize("body", [
+    b"",
+    struct.pack("<I", 3) + struct.pack("<I", 1),  # fewer hashes than announced
+    struct.pack("<II", 1, 9),  # no ciphertext length
+    struct.pack("<II", 1, 9) + struct.pack("<I", 10) + b"short",
+])
+def test_truncated_frames_are_rejected(api, body):
+    with pytest.raises((ValueError, struct.error)):
+        api.unpack_frame(body)
+
+
+def test_binary_routes_accept_frames(api):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(api.SecureSearchServer().app)
+
+    response = client.post("/search_bin", content=api.pack_frame([1], b"ct", {}))
+    assert response.status_code == 400  # not initialized
+
+    server = api.SecureSearchServer()
+    server.initialized = True
+    response = TestClient(server.app).post("/add_embedding_bin", content=b"\x05")
+    assert response.status_code == 400
@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def test_empty_store(api):
+    store = api.EmbeddingStore()
+
+    assert len(store) == 0
+    assert store.capacity == 1024
+    assert store.ids[np.empty(0, dtype=np.int64)].tolist() == []
+
+
+def test_single_row(api):
+    store = api.EmbeddingStore()
+    ciphertext = object()
+
+    assert store.append("e0", {"text": "a"}, ciphertext) == 0
+    assert len(store) == 1
+    assert store.ids[0] == "e0"
+    assert store.metadata[0] == {"text": "a"}
+    assert store.cts[0] is ciphertext
+
+
+def test_appends_match_naive_lists_across_growth(api):
+    store = api.EmbeddingStore()
+    count = store.capacity * 2 + 5
+    naive = []
+    for i in range(count):
+        row = (f"e{i}", {"i": i}, object())
+        naive.append(row)
+        assert store.append(*row) == i
+
+    assert len(store) == count
+    assert store.capacity >= count
+
+    # Candidate gathers are one fancy index per field
+    candidates = np.random.default_rng(0).choice(count, size=100, replace=False)
+    assert store.ids[candidates].tolist() == [naive[i][0] for i in candidates]
+    assert store.metadata[candidates].tolist() == [naive[i][1] for i in candidates]
+    assert all(store.cts[i] is naive[i][2] for i in candidates)
+
+
+def test_add_embedding_indexes_positions(api):
+    ts = api.ts
+    context = ts.context(ts.SCHEME_TYPE.CKKS, 8192, coeff_mod_bit_sizes=[60, 40, 40, 60])
+    context.global_scale = 2 ** 40
+    server = api.SecureSearchServer()
+    server.lsh_tables = [{}, {}]
+    server.context = context
+
+    for i, hashes in enumerate([[1, 2], [1, 3], [4, 2]]):
+        ciphertext = ts.ckks_vector(context, [float(i)]).serialize()
+        response = server._add_embedding(ciphertext, hashes, None, None)
+        assert response.index_position == i
+        assert response.embedding_id == f"emb_{i}"
+
+    assert {h: list(p) for h, p in server.lsh_tables[0].items()} == {1: [0, 1], 4: [2]}
+    assert {h: list(p) for h, p in server.lsh_tables[1].items()} == {2: [0, 2], 3: [1]}
+    assert server.store.metadata[2] == {}
+    assert [round(ct.decrypt()[0]) for ct in server.store.cts] == [0, 1, 2]
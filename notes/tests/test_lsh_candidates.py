@@ -0,0 +1,91 @@
+import array
+from collections import Counter
+
+import numpy as np
+import pytest
+from numba.typed import List as TypedList
+
+
+def _typed(postings):
+    typed = TypedList()
+    for posting in postings:
+        typed.append(np.asarray(posting, dtype=np.int32))
+    return typed
+
+
+def _naive_counts(postings):
+    return Counter(row for posting in postings for row in posting)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_count_postings_matches_naive(api, seed):
+    rng = np.random.default_rng(seed)
+    num_rows = 500
+    postings = [
+        np.sort(rng.choice(num_rows, size=rng.integers(1, 120), replace=False))
+        for _ in range(rng.integers(1, 12))
+    ]
+
+    rows, counts = api.count_postings(_typed(postings), num_rows)
+
+    assert dict(zip(rows.tolist(), counts.tolist())) == _naive_counts(postings)
+    assert len(set(rows.tolist())) == len(rows)
+
+
+def test_count_postings_edge_cases(api):
+    rows, counts = api.count_postings(_typed([[]]), 0)
+    assert len(rows) == 0 and len(counts) == 0
+
+    rows, counts = api.count_postings(_typed([[0], [0], [0]]), 1)
+    assert rows.tolist() == [0]
+    assert counts.tolist() == [3]
+
+
+def _server_with_postings(api, postings, num_rows):
+    server = api.SecureSearchServer()
+    server.lsh_tables = [{} for _ in postings]
+    for table_idx, posting in enumerate(postings):
+        server.lsh_tables[table_idx][7] = array.array('i', posting)
+    server.store.cts = [None] * num_rows  # only len(store) is read
+    return server
+
+
+def _naive_ranking(postings, limit):
+    counts = _naive_counts(postings)
+    return sorted(counts, key=lambda row: (-counts[row], row))[:limit]
+
+
+def test_find_candidates_ranks_late_rows_by_matches(api):
+    # The best row has the largest index; every table also holds many low
+    # rows matching only that one table
+    num_rows = 10_000
+    best = num_rows - 1
+    postings = [list(range(t * 500, t * 500 + 500)) + [best] for t in range(10)]
+    server = _server_with_postings(api, postings, num_rows)
+
+    candidates = server._find_candidates([7] * len(postings), 5)
+
+    assert candidates[0] == best
+    assert candidates.tolist() == _naive_ranking(postings, 5)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 50, 1000])
+def test_find_candidates_matches_naive(api, limit):
+    rng = np.random.default_rng(limit)
+    num_rows = 300
+    postings = [
+        np.sort(rng.choice(num_rows, size=rng.integers(1, 150), replace=False)).tolist()
+        for _ in range(8)
+    ]
+    server = _server_with_postings(api, postings, num_rows)
+
+    candidates = server._find_candidates([7] * len(postings), limit)
+
+    assert candidates.tolist() == _naive_ranking(postings, limit)
+
+
+def test_find_candidates_without_matches(api):
+    server = _server_with_postings(api, [[1, 2]], 3)
+
+    assert len(server._find_candidates([8], 10)) == 0
+    assert len(server._find_candidates([7], 0)) == 0
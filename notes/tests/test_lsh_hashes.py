@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def client(api):
+    client = api.SecureSearchClient.__new__(api.SecureSearchClient)
+    client.embedding_dim = 64
+    return client
+
+
+def _near_boundary_vectors(planes, count, seed):
+    """Random vectors, half of them nudged onto a hyperplane (projection ~ 0)"""
+    rng = np.random.default_rng(seed)
+    planes_flat = planes.reshape(-1, planes.shape[-1]).astype(np.float64)
+    vectors = rng.standard_normal((count, planes.shape[-1]))
+    for i in range(0, count, 2):
+        plane = planes_flat[rng.integers(len(planes_flat))]
+        vectors[i] -= (vectors[i] @ plane) / (plane @ plane) * plane
+    return vectors
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_batch_hashes_match_single_hashes(api, client, dtype):
+    planes = api.generate_random_planes(b"seed", 20, 16, 64)
+    vectors = _near_boundary_vectors(planes, 200, 0).astype(dtype)
+
+    batch = client._compute_lsh_hashes_batch(vectors, planes)
+
+    assert batch.shape == (200, 20)
+    for row, vector in zip(batch.tolist(), vectors):
+        assert row == client._compute_lsh_hashes(vector, planes)
+
+
+def test_hashes_match_sign_bits(api, client):
+    planes = api.generate_random_planes(b"seed", 4, 8, 64)
+    vectors = np.random.default_rng(1).standard_normal((50, 64))
+
+    projections = np.einsum("thd,nd->nth", planes.astype(np.float64), vectors.astype(np.float32))
+    expected = ((projections >= 0) * (1 << np.arange(8))).sum(axis=2)
+
+    # Rows with a projection too close to zero may legitimately differ
+    clear = (np.abs(projections) > 1e-4).all(axis=(1, 2))
+    batch = client._compute_lsh_hashes_batch(vectors, planes)
+    assert clear.sum() > 40
+    assert (batch[clear] == expected[clear]).all()
+
+
+def test_hashes_need_planes(client):
+    with pytest.raises(ValueError):
+        client._compute_lsh_hashes(np.zeros(64), None)
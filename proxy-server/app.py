@@ -1,6 +1,11 @@
 import os
+import asyncio
+import logging
 import httpx
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Security
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
@@ -8,15 +13,54 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+def positive_int_env(name: str, default: int) -> int:
+    """Read a positive integer setting, falling back to default if unset or invalid"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = 0
+    if parsed <= 0:
+        logger.warning(f"{name}={value!r} is not a positive integer, using {default}")
+        return default
+    return parsed
+
 # Configuration
 security = HTTPBearer()
 PROXY_API_KEY = os.getenv("PROXY_API_KEY", "default_proxy_key")
+PROXY_MAX_CONNECTIONS = positive_int_env("PROXY_MAX_CONNECTIONS", 200)
+PROXY_MAX_KEEPALIVE_CONNECTIONS = positive_int_env("PROXY_MAX_KEEPALIVE_CONNECTIONS", 100)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one pooled HTTP client across requests so connections are kept alive"""
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        # Every caller shares this client: refuse upstream Set-Cookie so no
+        # cookie is stored and replayed into another caller's requests
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+        limits=httpx.Limits(
+            max_connections=PROXY_MAX_CONNECTIONS,
+            max_keepalive_connections=PROXY_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
 
 # FastAPI app
 app = FastAPI(
     title="Proxy Server", 
     description="Proxy service for external third-party APIs", 
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Pydantic models
@@ -45,9 +89,8 @@ async def health_check():
     """Check proxy server health and external connectivity"""
     try:
         # Test external connectivity
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://httpbin.org/get", timeout=5.0)
-            external_status = "connected" if response.status_code == 200 else "failed"
+        response = await app.state.http.get("https://httpbin.org/get", timeout=5.0)
+        external_status = "connected" if response.status_code == 200 else "failed"
     except Exception:
         external_status = "failed"
     
@@ -66,60 +109,60 @@ async def proxy_request(
     api_key: str = Depends(verify_api_key)
 ):
     """Proxy requests to external third-party APIs"""
-    async with httpx.AsyncClient() as client:
-        try:
-            headers = request.headers or {}
-            timeout = request.timeout or 30
-            
-            if request.method.upper() == "GET":
-                response = await client.get(
-                    request.url, 
-                    headers=headers, 
-                    timeout=timeout
-                )
-            elif request.method.upper() == "POST":
-                response = await client.post(
-                    request.url, 
-                    headers=headers, 
-                    json=request.data,
-                    timeout=timeout
-                )
-            elif request.method.upper() == "PUT":
-                response = await client.put(
-                    request.url, 
-                    headers=headers, 
-                    json=request.data,
-                    timeout=timeout
-                )
-            elif request.method.upper() == "DELETE":
-                response = await client.delete(
-                    request.url, 
-                    headers=headers,
-                    timeout=timeout
-                )
-            elif request.method.upper() == "PATCH":
-                response = await client.patch(
-                    request.url, 
-                    headers=headers, 
-                    json=request.data,
-                    timeout=timeout
-                )
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported HTTP method")
-            
-            return ProxyResponse(
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                content=response.text,
-                success=200 <= response.status_code < 300
+    client = app.state.http
+    try:
+        headers = request.headers or {}
+        timeout = request.timeout or 30
+        
+        if request.method.upper() == "GET":
+            response = await client.get(
+                request.url, 
+                headers=headers, 
+                timeout=timeout
             )
-            
-        except httpx.TimeoutException:
-            raise HTTPException(status_code=504, detail="External API request timed out")
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"External API request failed: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Proxy error: {str(e)}")
+        elif request.method.upper() == "POST":
+            response = await client.post(
+                request.url, 
+                headers=headers, 
+                json=request.data,
+                timeout=timeout
+            )
+        elif request.method.upper() == "PUT":
+            response = await client.put(
+                request.url, 
+                headers=headers, 
+                json=request.data,
+                timeout=timeout
+            )
+        elif request.method.upper() == "DELETE":
+            response = await client.delete(
+                request.url, 
+                headers=headers,
+                timeout=timeout
+            )
+        elif request.method.upper() == "PATCH":
+            response = await client.patch(
+                request.url, 
+                headers=headers, 
+                json=request.data,
+                timeout=timeout
+            )
+        else:
+            raise HTTPException(status_code=400, detail="Unsupported HTTP method")
+        
+        return ProxyResponse(
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            content=response.text,
+            success=200 <= response.status_code < 300
+        )
+        
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="External API request timed out")
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"External API request failed: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Proxy error: {str(e)}")
 
 # Convenience endpoint for simple GET requests
 @app.get("/proxy/{path:path}")
@@ -145,22 +188,24 @@ async def test_external_connectivity(api_key: str = Depends(verify_api_key)):
         "https://jsonplaceholder.typicode.com/posts/1"
     ]
     
-    results = {}
+    client = app.state.http
+    
+    async def probe(url: str):
+        try:
+            response = await client.get(url, timeout=10.0)
+            return url, {
+                "status": "success",
+                "status_code": response.status_code,
+                "response_time_ms": int(response.elapsed.total_seconds() * 1000)
+            }
+        except Exception as e:
+            return url, {
+                "status": "failed",
+                "error": str(e)
+            }
     
-    async with httpx.AsyncClient() as client:
-        for url in test_urls:
-            try:
-                response = await client.get(url, timeout=10.0)
-                results[url] = {
-                    "status": "success",
-                    "status_code": response.status_code,
-                    "response_time_ms": int(response.elapsed.total_seconds() * 1000)
-                }
-            except Exception as e:
-                results[url] = {
-                    "status": "failed",
-                    "error": str(e)
-                }
+    # Probe all services concurrently so the endpoint waits for the slowest, not the sum
+    results = dict(await asyncio.gather(*(probe(url) for url in test_urls)))
     
     return {
         "service": "proxy-server",